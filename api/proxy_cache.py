@@ -0,0 +1,191 @@
+"""
+Upstream session and response cache shared by the proxy entry points
+(api/proxy.py on Vercel, application.py under a WSGI loader).
+"""
+import time
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from flask import Response, stream_with_context
+from werkzeug.datastructures import ResponseCacheControl
+from werkzeug.http import parse_cache_control_header
+import requests
+from requests.adapters import HTTPAdapter
+from http.cookiejar import DefaultCookiePolicy
+from urllib3.util.retry import Retry
+
+# Shared upstream session: keeps TCP/TLS connections alive between requests
+# instead of paying a fresh handshake on every proxied call. The cookie jar
+# rejects everything so upstream Set-Cookie never leaks between clients.
+_SESSION = requests.Session()
+_SESSION.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+_adapter = HTTPAdapter(pool_connections=100, pool_maxsize=100, max_retries=Retry(total=0))
+_SESSION.mount('http://', _adapter)
+_SESSION.mount('https://', _adapter)
+
+# Response headers never relayed (the body is re-framed by Flask)
+_EXCLUDED_RESP_HEADERS = frozenset({'content-encoding', 'content-length', 'transfer-encoding', 'connection'})
+# Request headers that must not be forwarded upstream
+_HOP_BY_HOP = frozenset({'host', 'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+                         'te', 'trailers', 'transfer-encoding', 'upgrade'})
+
+# In-process HTTP cache for idempotent GET/HEAD requests
+# Maps (method, url) -> stored response honoring upstream Cache-Control/Expires,
+# with ETag/Last-Modified kept for conditional revalidation once stale
+HTTP_CACHE_MAX_ENTRIES = 1024
+HTTP_CACHE_MAX_BODY = 1024 * 1024  # Larger bodies are always streamed, never buffered
+_http_cache = OrderedDict()
+_http_cache_lock = threading.Lock()
+
+# Negative cache: url -> expiry timestamp for upstream 404s, so clients polling a
+# missing resource don't pay a full upstream round-trip every time
+NEG_CACHE_TTL = 120
+NEG_CACHE_MAX_ENTRIES = 4096
+_neg_cache = OrderedDict()
+
+def _freshness_lifetime(resp_headers):
+    """Seconds an upstream response may be served from cache (None = must not store)"""
+    cache_control = parse_cache_control_header(resp_headers.get('Cache-Control'), cls=ResponseCacheControl)
+    if cache_control.no_store or cache_control.private:
+        return None
+    if cache_control.no_cache:
+        return 0
+    if cache_control.max_age is not None:
+        return cache_control.max_age
+    expires = resp_headers.get('Expires')
+    if expires:
+        try:
+            expires_at = parsedate_to_datetime(expires)
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            return max(0, expires_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+def _cache_get(key, lowered_headers):
+    with _http_cache_lock:
+        entry = _http_cache.get(key)
+        if entry is None:
+            return None
+        if any(lowered_headers.get(name) != value for name, value in entry['vary'].items()):
+            return None
+        _http_cache.move_to_end(key)
+        return entry
+
+def _cache_put(key, entry):
+    with _http_cache_lock:
+        _http_cache[key] = entry
+        _http_cache.move_to_end(key)
+        while len(_http_cache) > HTTP_CACHE_MAX_ENTRIES:
+            _http_cache.popitem(last=False)
+
+def _neg_cache_hit(url):
+    with _http_cache_lock:
+        expires = _neg_cache.get(url)
+        if expires is None:
+            return False
+        if time.time() >= expires:
+            del _neg_cache[url]
+            return False
+        return True
+
+def _neg_cache_put(url):
+    with _http_cache_lock:
+        _neg_cache[url] = time.time() + NEG_CACHE_TTL
+        _neg_cache.move_to_end(url)
+        while len(_neg_cache) > NEG_CACHE_MAX_ENTRIES:
+            _neg_cache.popitem(last=False)
+
+def _cached_response(entry, cache_status):
+    return Response(entry['body'], entry['status'], entry['headers'] + [('X-Proxy-Cache', cache_status)])
+
+def cached_request(method, url, headers, data, cookies):
+    """
+    Forward a request upstream, serving GET/HEAD from the HTTP cache when allowed.
+    Returns a Flask Response (buffered for cacheable bodies, streamed otherwise).
+    """
+    lowered_headers = {key.lower(): value for (key, value) in headers.items()}
+    # Never share responses for credentialed requests; Range requests (media
+    # seeks) must get upstream's 206, not a stored full body, and stay uncached
+    cacheable = (method in ('GET', 'HEAD')
+                 and 'authorization' not in lowered_headers
+                 and 'cookie' not in lowered_headers
+                 and 'range' not in lowered_headers)
+    request_cache_control = parse_cache_control_header(lowered_headers.get('cache-control'))
+    if request_cache_control.no_store:
+        cacheable = False
+    
+    use_neg_cache = cacheable and method == 'GET' and not request_cache_control.no_cache
+    if use_neg_cache and _neg_cache_hit(url):
+        return Response('', 404, {'X-Proxy-Cache': 'NEG-HIT'})
+    
+    key = (method, url)
+    entry = _cache_get(key, lowered_headers) if cacheable else None
+    if entry is not None:
+        if not request_cache_control.no_cache and time.time() < entry['expires']:
+            return _cached_response(entry, 'HIT')
+        if 'if-none-match' in lowered_headers or 'if-modified-since' in lowered_headers:
+            # Client is revalidating its own copy; let its 304 pass through untouched
+            entry = None
+        else:
+            headers = dict(headers)
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+    
+    resp = _SESSION.request(
+        method=method,
+        url=url,
+        headers=headers,
+        data=data,
+        cookies=cookies,
+        allow_redirects=False,
+        timeout=30,
+        stream=True
+    )
+    
+    if entry is not None and resp.status_code == 304:
+        resp.close()
+        with _http_cache_lock:
+            entry['expires'] = time.time() + (_freshness_lifetime(resp.headers) or 0)
+        return _cached_response(entry, 'REVALIDATED')
+    
+    if resp.status_code == 404 and cacheable and method == 'GET':
+        _neg_cache_put(url)
+    
+    response_headers = [(name, value) for (name, value) in resp.raw.headers.items()
+                        if name.lower() not in _EXCLUDED_RESP_HEADERS]
+    
+    if cacheable and resp.status_code == 200:
+        lifetime = _freshness_lifetime(resp.headers)
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        vary = resp.headers.get('Vary', '')
+        length = resp.headers.get('Content-Length', '')
+        # A stored Set-Cookie would be replayed to every client that hits the entry
+        if (lifetime is not None and (lifetime > 0 or etag or last_modified)
+                and vary.strip() != '*'
+                and 'Set-Cookie' not in resp.headers
+                and length.isdigit() and int(length) <= HTTP_CACHE_MAX_BODY):
+            body = resp.content
+            resp.close()
+            vary_names = [name.strip().lower() for name in vary.split(',') if name.strip()]
+            _cache_put(key, {
+                'status': resp.status_code,
+                'headers': response_headers,
+                'body': body,
+                'expires': time.time() + lifetime,
+                'etag': etag,
+                'last_modified': last_modified,
+                'vary': {name: lowered_headers.get(name) for name in vary_names}
+            })
+            return Response(body, resp.status_code, response_headers + [('X-Proxy-Cache', 'MISS')])
+    
+    # Relay the body in chunks so memory stays bounded regardless of upstream size
+    response = Response(stream_with_context(resp.iter_content(chunk_size=64 * 1024)),
+                        resp.status_code, response_headers)
+    response.call_on_close(resp.close)
+    return response
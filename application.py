@@ -1,6 +1,10 @@
-from flask import Flask, request, Response
-import requests
+import os
 import sys
+from flask import Flask, request, Response
+
+# proxy_cache lives beside the Vercel entry point in api/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+from proxy_cache import cached_request, _HOP_BY_HOP
 
 # Initialize Flask app
 # The WSGI loader looks for 'app' or 'application' in this file
@@ -34,25 +38,11 @@ def proxy(path):
     # This might fail for "CONNECT" requests (HTTPS).
     
     try:
-        # Exclude host header to avoid conflicts
-        headers = {key: value for (key, value) in request.headers if key != 'Host'}
-        
-        resp = requests.request(
-            method=request.method,
-            url=request.url,
-            headers=headers,
-            data=request.get_data(),
-            cookies=request.cookies,
-            allow_redirects=False,
-            timeout=30
-        )
-        
-        excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
-        headers = [(name, value) for (name, value) in resp.raw.headers.items()
-                   if name.lower() not in excluded_headers]
+        # Exclude host header to avoid conflicts, plus hop-by-hop headers (RFC 7230)
+        headers = {key: value for (key, value) in request.headers if key.lower() not in _HOP_BY_HOP}
         
-        response = Response(resp.content, resp.status_code, headers)
-        return response
+        return cached_request(request.method, request.url, headers,
+                              request.get_data(), request.cookies)
         
     except Exception as e:
         return Response(f"Proxy Error: {str(e)}", 500)
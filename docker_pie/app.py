@@ -4,7 +4,14 @@ YouTube Stream Extractor API with Playground UI
 Includes inline youtube_extractor logic to avoid import issues in Docker
 """
 import os
+
+# gunicorn's gevent worker needs sockets/threads patched before requests is imported
+if os.environ.get('ENV') == 'production' and os.environ.get('WORKER_CLASS', 'gevent') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 import sys
+import re
 import json
 import subprocess
 import shutil
@@ -14,20 +21,253 @@ import base64
 import hashlib
 import asyncio
 import threading
+import time
+import queue
+import atexit
+import logging
+from contextlib import contextmanager
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory, render_template_string
+from flask import Flask, Response, request, jsonify, send_from_directory, render_template_string, stream_with_context
+from requests.adapters import HTTPAdapter
 from urllib.parse import quote, unquote
+from flask.json.provider import DefaultJSONProvider
+
+# orjson when available (much faster on large yt-dlp JSON); stdlib json otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+# Prefer the in-process yt-dlp API; fall back to `python -m yt_dlp` subprocesses
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
 
 app = Flask(__name__, static_url_path='/static', static_folder='static')
 
+# jsonify() goes through this provider, so the batch and search payloads (lists
+# of full result dicts) are encoded by orjson directly to bytes
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+    
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Cache lifetime for files sent through Flask (fallback when WhiteNoise is absent)
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600
+
+# YouTube video IDs are exactly 11 characters of [A-Za-z0-9_-]; anything else
+# is rejected before it can reach yt-dlp
+VIDEO_ID_RE = re.compile(r'[A-Za-z0-9_-]{11}')
+
+def valid_video_id(video_id):
+    return video_id is not None and VIDEO_ID_RE.fullmatch(video_id) is not None
+
+# Rejected video IDs per client address, logged as one summary line per minute
+# so scanner traffic can't flood the log
+rejected_ids = Counter()
+rejected_ids_lock = threading.Lock()
+
+# Bytes shared by invalid_id_response() and the 404/500 handlers, so rejecting
+# malformed IDs and unknown paths costs no JSON encoding
+def _error_body(message):
+    return json.dumps({'error': message}, separators=(',', ':')).encode() + b'\n'
+
+def json_error(body, status):
+    """Return a pre-serialized JSON error body"""
+    return Response(body, status=status, mimetype='application/json')
+
+def invalid_id_response():
+    """400 for a malformed video ID (tallied for the per-minute rejection log)"""
+    with rejected_ids_lock:
+        rejected_ids[request.remote_addr] += 1
+    return json_error(ERR_INVALID_ID, 400)
+
+ERR_INVALID_ID = _error_body('Invalid video ID')
+ERR_EXTRACT_FAILED = _error_body('Failed to extract stream')
+ERR_NOT_FOUND = _error_body('Not found')
+ERR_SERVER = _error_body('Server error')
+# Per-video failure body; %s is the JSON-encoded video_id (keys sorted like jsonify)
+ERR_EXTRACT_FAILED_TMPL = (b'{"error":"Failed to extract stream","reason":"Video may be unavailable, '
+                           b'require authentication, or need JavaScript runtime support","video_id":%s}\n')
+
+# Serve /static/* from WhiteNoise in front of Flask when available: files are
+# indexed once at startup and served with ETag, gzip and range support without
+# entering the Flask request cycle. Falls back to Flask's static route otherwise.
+try:
+    from whitenoise import WhiteNoise
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root=app.static_folder, prefix='static/', max_age=3600)
+except ImportError:
+    pass
+
 # URL Cache for proxy streaming (maps short ID -> full URL)
 # Reduces proxy URL length from 2000+ chars to ~50 chars
 url_cache = {}
 
 # Extraction Result Cache (maps video_id -> extraction result)
-# Avoids re-extracting the same video within TTL
-extraction_cache = {}
+# Avoids re-extracting the same video within TTL; LRU-bounded so a stream of
+# one-off videos cannot grow it without limit
+extraction_cache = OrderedDict()
+extraction_cache_lock = threading.RLock()
 CACHE_TTL = 3600  # 1 hour
+CACHE_MAX_ENTRIES = 512
+# video_id -> Event for extractions in progress, so concurrent misses for the
+# same video wait on one yt-dlp run instead of each starting their own
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Shared executor for fan-out endpoints (/api/batch/stream, search ?resolve=1).
+# Extractions mostly wait on the network, so threads overlap well; threads are
+# created lazily, on first use inside a worker
+BATCH_MAX_WORKERS = 8
+BATCH_MAX_IDS = 20
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+# In-process extractions run here so the request stops waiting after the
+# extractor's timeout (socket_timeout only bounds single reads). Sized above
+# BATCH_MAX_WORKERS so a full batch doesn't starve single requests; a
+# timed-out call finishes in the background
+EXTRACT_MAX_WORKERS = int(os.environ.get('YT_EXTRACT_WORKERS', '16'))
+extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_MAX_WORKERS, thread_name_prefix='ytdlp')
+
+# Shared upstream session for stream relaying: keep-alive connections to the
+# googlevideo hosts are reused instead of re-handshaking for every play request
+stream_session = requests.Session()
+stream_session.mount('https://', HTTPAdapter(pool_connections=20, pool_maxsize=100))
+stream_session.mount('http://', HTTPAdapter(pool_connections=20, pool_maxsize=100))
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# Optional HTTP/2 client: parallel segment requests to one googlevideo origin
+# are multiplexed over a single connection. Needs httpx[http2]; without it the
+# requests session above is used.
+try:
+    import httpx
+    stream_client = httpx.Client(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100)
+    )
+except ImportError:
+    stream_client = None
+
+# Persistent yt-dlp cache (player JS, signature solutions) reused across calls
+YTDLP_CACHE_DIR = os.environ.get('YTDLP_CACHE_DIR', '/tmp/yt-dlp-cache')
+os.makedirs(YTDLP_CACHE_DIR, exist_ok=True)
+
+STREAM_FORMAT = 'best[ext=mp4][protocol^=http]/best[protocol^=http]'
+
+YT_WATCH_URL = 'https://www.youtube.com/watch?v='
+YT_THUMB_URL = 'https://img.youtube.com/vi/'
+
+def _find_node():
+    """Locate Node.js once (used by yt-dlp as JS runtime for signature solving)"""
+    node_path = shutil.which('node')
+    if node_path:
+        return node_path
+    for path in ['/usr/bin/node', '/usr/local/bin/node', '/bin/node']:
+        if os.path.exists(path):
+            return path
+    return None
+
+NODE_PATH = _find_node()
+
+# Invariant parts of the stream extraction, built once: in-process YoutubeDL
+# params and the `python -m yt_dlp` fallback command (URL/cookies appended per call)
+STREAM_YDL_PARAMS = {
+    'format': STREAM_FORMAT,
+    'noplaylist': True,
+    'nocheckcertificate': True,
+    'remote_components': ['ejs:github']
+}
+STREAM_CMD_PREFIX = [
+    sys.executable, "-m", "yt_dlp",
+    '--cache-dir', YTDLP_CACHE_DIR, '--no-check-certificate', '--dump-single-json',
+    '--no-playlist', '-f', STREAM_FORMAT,
+    '--remote-components', 'ejs:github'
+]
+if NODE_PATH:
+    STREAM_YDL_PARAMS['js_runtimes'] = {'node': {}}
+    STREAM_CMD_PREFIX.extend(['--js-runtimes', 'node'])
+
+# How often a resolved cookie source is re-stat'ed for changes
+COOKIE_RECHECK_INTERVAL = 30
+
+# Search results cache: 15 min TTL, scan-resistant (see _SearchCache)
+SEARCH_CACHE_TTL = 900
+SEARCH_CACHE_MAX_ENTRIES = 256
+
+class _SearchCache:
+    """Scan-resistant TTL cache for search results (segmented LRU)
+    
+    New queries enter a small probationary segment and are only promoted to the
+    protected segment on a second hit, so a burst of one-off queries churns the
+    probationary entries without evicting the popular ones.
+    """
+    
+    def __init__(self, max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL):
+        self.ttl = ttl
+        self.protected_max = max_entries * 3 // 4
+        self.probation_max = max_entries - self.protected_max
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            for segment in (self._protected, self._probation):
+                entry = segment.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= time.monotonic():
+                    del segment[key]
+                    return None
+                if segment is self._probation:
+                    del self._probation[key]
+                    self._protected[key] = entry
+                    if len(self._protected) > self.protected_max:
+                        # Demote the coldest protected entry instead of dropping it
+                        self._insert_probation(*self._protected.popitem(last=False))
+                else:
+                    segment.move_to_end(key)
+                return entry[1]
+            return None
+    
+    def put(self, key, value):
+        with self._lock:
+            entry = (time.monotonic() + self.ttl, value)
+            if key in self._protected:
+                self._protected[key] = entry
+                self._protected.move_to_end(key)
+            else:
+                self._probation.pop(key, None)
+                self._insert_probation(key, entry)
+    
+    def _insert_probation(self, key, entry):
+        self._probation[key] = entry
+        while len(self._probation) > self.probation_max:
+            self._probation.popitem(last=False)
 
 # ===== INLINE: YoutubeExtractor Class =====
 class YoutubeExtractor:
@@ -37,7 +277,20 @@ class YoutubeExtractor:
         self.cookies_file = cookies_file
         self.timeout = timeout
         self.log_func = log_func or self._default_log
-        self.cookie_manager = {'path': None, 'loaded': False}
+        self.cookie_manager = {
+            'path': None, 'loaded': False, 'resolved': False,
+            'source': None, 'mtime': None, 'checked_at': 0.0, 'generation': 0
+        }
+        # Idle YoutubeDL instances keyed by (kind, cookie_path); an instance is
+        # never shared between threads, so concurrent calls each check one out
+        self._ydl_pool = {}
+        self._ydl_pool_lock = threading.Lock()
+        self._search_cache = _SearchCache()
+        
+        if NODE_PATH:
+            self.log(f'📦 Using Node.js JS runtime from: {NODE_PATH}')
+        else:
+            self.log('⚠️ Node.js not found - some videos may fail')
     
     def _default_log(self, msg):
         print(f"[YT] {msg}", flush=True)
@@ -46,10 +299,63 @@ class YoutubeExtractor:
         self.log_func(msg)
     
     def get_cookie_file_path(self):
-        """Get or create cookie file path (reuse existing if available)."""
-        if self.cookie_manager['loaded'] and self.cookie_manager['path'] and os.path.exists(self.cookie_manager['path']):
-            return self.cookie_manager['path']
+        """Get cookie file path, resolved once per extractor
         
+        The source file is re-stat'ed at most every COOKIE_RECHECK_INTERVAL
+        seconds and cookies are reloaded only if its mtime changed.
+        """
+        manager = self.cookie_manager
+        if manager['resolved']:
+            now = time.monotonic()
+            if now - manager['checked_at'] < COOKIE_RECHECK_INTERVAL:
+                return manager['path']
+            manager['checked_at'] = now
+            if self._cookie_source_mtime(manager['source']) == manager['mtime']:
+                return manager['path']
+            self.log('🍪 Cookie source changed, reloading')
+            with self._ydl_pool_lock:
+                self._ydl_pool.clear()
+        manager['source'] = None
+        cookie_path = self._resolve_cookie_file_path()
+        manager['path'] = cookie_path
+        manager['loaded'] = bool(cookie_path)
+        manager['mtime'] = self._cookie_source_mtime(manager['source'])
+        manager['checked_at'] = time.monotonic()
+        manager['generation'] += 1
+        manager['resolved'] = True
+        return cookie_path
+    
+    @staticmethod
+    def _cookie_source_mtime(source):
+        if not source:
+            return None
+        try:
+            return os.stat(source).st_mtime
+        except OSError:
+            return None
+    
+    def _write_runtime_cookies(self, cookie_data):
+        """Copy cookie data to the runtime file, skipping the write if it is already current"""
+        cookie_path = os.path.join(tempfile.gettempdir(), "yt_cookies_runtime.txt")
+        hash_path = cookie_path + ".hash"
+        data = cookie_data.encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        try:
+            with open(hash_path, "r") as f:
+                if f.read() == digest and os.path.exists(cookie_path):
+                    return cookie_path
+        except OSError:
+            pass
+        # Write-then-rename so concurrently booting workers never see a partial file
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(cookie_path), delete=False) as f:
+            f.write(data)
+        os.replace(f.name, cookie_path)
+        with open(hash_path, "w") as f:
+            f.write(digest)
+        return cookie_path
+    
+    def _resolve_cookie_file_path(self):
+        """Search the known cookie locations and YTDLP_COOKIES for usable cookies"""
         possible_paths = [
             self.cookies_file, '/app/cookies.txt', '/tmp/cookies.txt', 'cookies.txt'
         ]
@@ -68,17 +374,10 @@ class YoutubeExtractor:
                             cookie_data = f.read()
                         self.log(f'✓ Successfully read {len(cookie_data)} bytes from {path}')
                         if cookie_data.strip():
-                            temp_dir = tempfile.gettempdir()
-                            cookie_path = os.path.join(temp_dir, "yt_cookies_runtime.txt")
-                            self.log(f'🔍 DEBUG: Creating runtime cookie file at: {cookie_path}')
-                            
-                            if not os.path.exists(cookie_path):
-                                with open(cookie_path, "w", encoding='utf-8') as f:
-                                    f.write(cookie_data)
-                            
-                            self.cookie_manager['path'] = cookie_path
-                            self.cookie_manager['loaded'] = True
+                            cookie_path = self._write_runtime_cookies(cookie_data)
+                            self.log(f'🔍 DEBUG: Runtime cookie file at: {cookie_path}')
                             self.log(f'🍪 Cookies loaded from: {path} ({len(cookie_data)} bytes)')
+                            self.cookie_manager['source'] = path
                             return cookie_path
                     except Exception as e:
                         self.log(f'⚠️ Failed to load cookies from {path}: {e}')
@@ -92,13 +391,7 @@ class YoutubeExtractor:
         if cookie_data:
             self.log(f'✓ Found YTDLP_COOKIES environment variable ({len(cookie_data)} bytes)')
             try:
-                temp_dir = tempfile.gettempdir()
-                cookie_path = os.path.join(temp_dir, "yt_cookies_runtime.txt")
-                if not os.path.exists(cookie_path):
-                    with open(cookie_path, "w", encoding='utf-8') as f:
-                        f.write(cookie_data)
-                self.cookie_manager['path'] = cookie_path
-                self.cookie_manager['loaded'] = True
+                cookie_path = self._write_runtime_cookies(cookie_data)
                 self.log(f'🍪 Cookies loaded from environment (YTDLP_COOKIES)')
                 return cookie_path
             except Exception as e:
@@ -109,42 +402,92 @@ class YoutubeExtractor:
         self.log('❌ No cookies found - yt-dlp will require authentication for protected videos')
         return None
     
+    @contextmanager
+    def _ydl(self, kind, params):
+        """Check out a reusable YoutubeDL instance for one call"""
+        cookie_path = self.get_cookie_file_path()
+        # YoutubeDL loads the cookie jar once, so instances are tied to a cookie generation
+        generation = self.cookie_manager['generation']
+        key = (kind, cookie_path, generation)
+        with self._ydl_pool_lock:
+            idle = self._ydl_pool.setdefault(key, [])
+            ydl = idle.pop() if idle else None
+        if ydl is None:
+            opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'skip_download': True,
+                'cachedir': YTDLP_CACHE_DIR,
+                'socket_timeout': self.timeout
+            }
+            opts.update(params)
+            if cookie_path:
+                opts['cookiefile'] = cookie_path
+            ydl = yt_dlp.YoutubeDL(opts)
+        try:
+            yield ydl
+        finally:
+            with self._ydl_pool_lock:
+                # Instances holding a reloaded cookie jar are dropped
+                if generation == self.cookie_manager['generation']:
+                    self._ydl_pool.setdefault(key, []).append(ydl)
+    
+    def _search_subprocess(self, query, limit):
+        """Run a search as a `python -m yt_dlp` subprocess"""
+        command = [
+            sys.executable, "-m", "yt_dlp",
+            f"ytsearch{limit}:{query}",
+            "--dump-single-json", "--flat-playlist", "--cache-dir", YTDLP_CACHE_DIR
+        ]
+        
+        cookie_path = self.get_cookie_file_path()
+        if cookie_path:
+            command.extend(["--cookies", cookie_path])
+        
+        # stdout stays bytes: _json_loads parses it without a str decode
+        process = subprocess.run(command, capture_output=True, check=False, timeout=self.timeout)
+        
+        if process.returncode != 0:
+            self.log(f"⚠️ Search failed: {process.stderr[:200].decode('utf-8', 'replace')}")
+            return None
+        return _json_loads(process.stdout)
+    
     def search_youtube(self, query, limit=5):
-        """Search YouTube using yt-dlp subprocess"""
+        """Search YouTube using yt-dlp (in-process API, subprocess fallback)"""
+        cached = self._search_cache.get((query, limit))
+        if cached is not None:
+            return list(cached)
         try:
-            command = [
-                sys.executable, "-m", "yt_dlp",
-                f"ytsearch{limit}:{query}",
-                "--dump-single-json", "--flat-playlist", "--no-cache-dir"
-            ]
-            
-            cookie_path = self.get_cookie_file_path()
-            if cookie_path:
-                command.extend(["--cookies", cookie_path])
-            
-            process = subprocess.run(command, capture_output=True, text=True, check=False, timeout=self.timeout)
-            
-            if process.returncode != 0:
-                self.log(f'⚠️ Search failed: {process.stderr[:200]}')
-                return []
+            if yt_dlp is not None:
+                with self._ydl('search', {'extract_flat': 'in_playlist'}) as ydl:
+                    data = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
+            else:
+                data = self._search_subprocess(query, limit)
+                if data is None:
+                    return []
             
-            data = json.loads(process.stdout)
             results = []
-            if 'entries' in data:
-                for entry in data['entries'][:limit]:
-                    if entry:
-                        results.append({
-                            'videoId': entry.get('id', ''),
-                            'id': entry.get('id', ''),
-                            'title': entry.get('title', 'Unknown Title'),
-                            'name': entry.get('title', 'Unknown Title'),
-                            'duration': entry.get('duration_string', 'Unknown'),
-                            'url': f"https://www.youtube.com/watch?v={entry.get('id', '')}",
-                            'thumbnail': entry.get('thumbnail', f"https://img.youtube.com/vi/{entry.get('id', '')}/mqdefault.jpg"),
-                            'uploader': entry.get('uploader', 'Unknown'),
-                            'artist': entry.get('uploader', 'Unknown')
-                        })
+            # ytsearch{limit} already caps the entries; islice just guards a single pass
+            for entry in islice((data or {}).get('entries') or (), limit):
+                if entry:
+                    video_id = entry.get('id', '')
+                    title = entry.get('title', 'Unknown Title')
+                    uploader = entry.get('uploader', 'Unknown')
+                    results.append({
+                        'videoId': video_id,
+                        'id': video_id,
+                        'title': title,
+                        'name': title,
+                        'duration': entry.get('duration_string', 'Unknown'),
+                        'url': YT_WATCH_URL + video_id,
+                        'thumbnail': entry.get('thumbnail', YT_THUMB_URL + video_id + '/mqdefault.jpg'),
+                        'uploader': uploader,
+                        'artist': uploader
+                    })
             self.log(f'✅ Search found {len(results)} results for: {query}')
+            if results:
+                self._search_cache.put((query, limit), results)
+                return list(results)
             return results
         except subprocess.TimeoutExpired:
             self.log(f'❌ Search timeout ({self.timeout}s)')
@@ -153,42 +496,51 @@ class YoutubeExtractor:
             self.log(f'Search error: {e}')
             return []
     
+    def _extract_info_inprocess(self, video_id, youtube_url):
+        """Run the stream extraction through a pooled YoutubeDL instance, waiting at most self.timeout"""
+        self.log(f'🎬 Extracting video: {video_id}')
+        future = extract_executor.submit(self._run_stream_ydl, youtube_url)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            self.log(f'❌ Extraction timeout ({self.timeout}s)')
+            return None
+        except yt_dlp.utils.DownloadError as e:
+            self.log(f'❌ yt-dlp failed: {str(e)[:300]}')
+            return None
+    
+    def _run_stream_ydl(self, youtube_url):
+        with self._ydl('stream', STREAM_YDL_PARAMS) as ydl:
+            return ydl.extract_info(youtube_url, download=False)
+    
+    def _extract_info_subprocess(self, video_id, youtube_url):
+        """Run the stream extraction as a `python -m yt_dlp` subprocess"""
+        cmd = STREAM_CMD_PREFIX + [youtube_url]
+        
+        cookie_path = self.get_cookie_file_path()
+        if cookie_path:
+            cmd.extend(['--cookies', cookie_path])
+        
+        self.log(f'🎬 Extracting video: {video_id}')
+        result = subprocess.run(cmd, capture_output=True, timeout=self.timeout)
+        
+        if result.returncode != 0:
+            self.log(f"❌ yt-dlp failed: {result.stderr[:300].decode('utf-8', 'replace')}")
+            return None
+        return _json_loads(result.stdout)
+    
     def extract_youtube_stream(self, video_id):
-        """Extract YouTube stream URL using yt-dlp subprocess"""
+        """Extract YouTube stream URL using yt-dlp (in-process API, subprocess fallback)"""
         try:
             youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-            cmd = [
-                sys.executable, "-m", "yt_dlp", youtube_url,
-                '--no-cache-dir', '--no-check-certificate', '--dump-single-json',
-                '--no-playlist', '-f', 'best[ext=mp4][protocol^=http]/best[protocol^=http]',
-                '--remote-components', 'ejs:github'
-            ]
             
-            node_path = shutil.which('node')
-            if node_path:
-                cmd.extend(['--js-runtimes', 'node'])
-                self.log(f'📦 Using Node.js JS runtime from: {node_path}')
+            if yt_dlp is not None:
+                data = self._extract_info_inprocess(video_id, youtube_url)
             else:
-                for path in ['/usr/bin/node', '/usr/local/bin/node', '/bin/node']:
-                    if os.path.exists(path):
-                        cmd.extend(['--js-runtimes', 'node'])
-                        self.log(f'📦 Using Node.js JS runtime from: {path}')
-                        break
-                else:
-                    self.log('⚠️ Node.js not found - some videos may fail')
-            
-            cookie_path = self.get_cookie_file_path()
-            if cookie_path:
-                cmd.extend(['--cookies', cookie_path])
-            
-            self.log(f'🎬 Extracting video: {video_id}')
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
-            
-            if result.returncode != 0:
-                self.log(f'❌ yt-dlp failed: {result.stderr[:300]}')
+                data = self._extract_info_subprocess(video_id, youtube_url)
+            if not data:
                 return None
             
-            data = json.loads(result.stdout)
             stream_url = data.get('url')
             if not stream_url:
                 self.log(f'❌ No stream URL found in response')
@@ -221,34 +573,72 @@ PORT = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get('PORT', '50
 
 os.makedirs(LOG_DIR, exist_ok=True)
 
-def log(msg):
-    """Log messages to stdout and file"""
-    ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_line = f"[{ts}] {msg}"
-    print(log_line, flush=True)
+class _DailyFileHandler(logging.FileHandler):
+    """Append to LOG_DIR/api_YYYY-MM-DD.log, switching files when the date changes
+
+    Every gunicorn process (master and workers) appends to the same per-day
+    file; nothing is renamed, so there is no rotation for them to race on.
+    """
     
-    try:
-        log_file = os.path.join(LOG_DIR, f"api_{datetime.now().strftime('%Y-%m-%d')}.log")
-        with open(log_file, 'a') as f:
-            f.write(log_line + '\n')
-    except:
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        self.day = datetime.now().strftime('%Y-%m-%d')
+        super().__init__(self._path(), mode='a', encoding='utf-8', delay=True)
+    
+    def _path(self):
+        return os.path.join(self.log_dir, f'api_{self.day}.log')
+    
+    def emit(self, record):
+        day = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d')
+        if day != self.day:
+            self.day = day
+            self.close()
+            self.baseFilename = self._path()
+        super().emit(record)
+    
+    def handleError(self, record):
+        # An unwritable LOG_DIR must not spam tracebacks; stdout still has the line
         pass
 
+# Log records are queued by request threads and written to stdout and the
+# day's log file by a background listener, keeping disk I/O off the request path
+_log_queue = queue.Queue(-1)
+_log_formatter = logging.Formatter('[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+_log_handlers = [logging.StreamHandler(sys.stdout), _DailyFileHandler(LOG_DIR)]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+
+def _stop_log_listener():
+    """Drain and stop whichever listener this process owns (replaced after fork)"""
+    _log_listener.stop()
+
+atexit.register(_stop_log_listener)
+
+_logger = logging.getLogger('youtube-stream-api')
+_logger.setLevel(logging.INFO)
+_log_queue_handler = QueueHandler(_log_queue)
+_logger.addHandler(_log_queue_handler)
+_logger.propagate = False
+
+def log(msg):
+    """Log messages to stdout and file (non-blocking enqueue)"""
+    _logger.info(msg)
+
 # Initialize shared extractor
 extractor = YoutubeExtractor(
     cookies_file=os.environ.get('COOKIES_FILE'),
     timeout=int(os.environ.get('REQUEST_TIMEOUT', '60')),
     log_func=log
 )
+# Resolve cookies at import: under `gunicorn --preload` the master does the
+# lookup and runtime-file write once and every worker inherits the result
+extractor.get_cookie_file_path()
 
-# Use extractor's methods directly
-def extract_youtube_stream(video_id):
-    """Proxy to extractor"""
-    return extractor.extract_youtube_stream(video_id)
-
-def search_youtube(query, limit=5):
-    """Proxy to extractor"""
-    return extractor.search_youtube(query, limit=limit)
+# Use extractor's methods directly (bound once, no pass-through frames)
+extract_youtube_stream = extractor.extract_youtube_stream
+search_youtube = extractor.search_youtube
 
 def cache_stream_url(url):
     """Cache a stream URL and return short ID instead of encoding full URL
@@ -261,21 +651,74 @@ def cache_stream_url(url):
 
 def get_cached_extraction(video_id):
     """Get cached extraction result if available and not expired"""
-    if video_id in extraction_cache:
-        cached = extraction_cache[video_id]
-        if (datetime.now() - cached['timestamp']).total_seconds() < CACHE_TTL:
-            log(f'⚡ Cache HIT for {video_id}')
-            return cached['result']
-        else:
+    with extraction_cache_lock:
+        cached = extraction_cache.get(video_id)
+        if cached is None:
+            return None
+        if (datetime.now() - cached['timestamp']).total_seconds() >= CACHE_TTL:
             del extraction_cache[video_id]  # Expired
-    return None
+            return None
+        extraction_cache.move_to_end(video_id)
+    log(f'⚡ Cache HIT for {video_id}')
+    return cached['result']
 
 def set_cached_extraction(video_id, result):
-    """Cache extraction result with timestamp"""
-    extraction_cache[video_id] = {
-        'result': result,
-        'timestamp': datetime.now()
-    }
+    """Cache extraction result with timestamp, evicting the least recently used"""
+    with extraction_cache_lock:
+        extraction_cache[video_id] = {
+            'result': result,
+            'timestamp': datetime.now()
+        }
+        extraction_cache.move_to_end(video_id)
+        while len(extraction_cache) > CACHE_MAX_ENTRIES:
+            extraction_cache.popitem(last=False)
+
+def get_stream_result(video_id):
+    """Return (result, is_cached) for a video, extracting on a cache miss
+    Concurrent misses for one video share a single extraction.
+    Proxy fields (cache_id/proxy_url) are computed once per extraction and
+    stored with the cached result, so cache hits skip the URL hashing.
+    Returns a copy, so callers may add per-response fields freely.
+    """
+    cached_result = get_cached_extraction(video_id)
+    if cached_result:
+        return dict(cached_result), True
+    
+    with _inflight_lock:
+        event = _inflight.get(video_id)
+        is_owner = event is None
+        if is_owner:
+            event = _inflight[video_id] = threading.Event()
+    
+    if not is_owner:
+        # Another request is already extracting this video; reuse its result
+        event.wait(extractor.timeout)
+        cached_result = get_cached_extraction(video_id)
+        if cached_result:
+            return dict(cached_result), True
+        return None, False
+    
+    try:
+        result = extract_youtube_stream(video_id)
+        if not result:
+            return None, False
+        
+        # Use cached short ID instead of full base64 encoding
+        stream_url = result.get('url', '')
+        if stream_url:
+            cache_id = cache_stream_url(stream_url)
+            result['proxy_url'] = f"/stream/play?id={cache_id}"
+            result['cache_id'] = cache_id
+        set_cached_extraction(video_id, result)
+        return dict(result), False
+    finally:
+        with _inflight_lock:
+            _inflight.pop(video_id, None)
+        event.set()
+
+def resolve_streams(video_ids):
+    """get_stream_result() for several videos concurrently, in input order"""
+    return list(batch_executor.map(get_stream_result, video_ids))
 
 # Start background cleanup thread for expired cache entries
 def cleanup_expired_cache():
@@ -284,16 +727,25 @@ def cleanup_expired_cache():
         try:
             threading.Event().wait(60)  # Check every 60 seconds
             expired = []
-            for vid, cached in list(extraction_cache.items()):
-                age = (datetime.now() - cached['timestamp']).total_seconds()
-                if age > CACHE_TTL:
-                    expired.append(vid)
-            
-            for vid in expired:
-                del extraction_cache[vid]
+            with extraction_cache_lock:
+                for vid, cached in list(extraction_cache.items()):
+                    age = (datetime.now() - cached['timestamp']).total_seconds()
+                    if age > CACHE_TTL:
+                        expired.append(vid)
+                
+                for vid in expired:
+                    del extraction_cache[vid]
             
             if expired:
                 log(f'🧹 Cleaned {len(expired)} expired cache entries')
+            
+            with rejected_ids_lock:
+                rejected = rejected_ids.most_common(3)
+                total = sum(rejected_ids.values())
+                rejected_ids.clear()
+            if total:
+                top = ', '.join(f'{addr}×{count}' for addr, count in rejected)
+                log(f'🚫 Rejected {total} invalid video IDs in the last minute (top: {top})')
         except:
             pass
 
@@ -301,10 +753,35 @@ def cleanup_expired_cache():
 cleanup_thread = threading.Thread(target=cleanup_expired_cache, daemon=True)
 cleanup_thread.start()
 
+def _restart_background_threads():
+    """Threads don't survive fork: give each preloaded gunicorn worker its own log listener and cache cleanup"""
+    global _log_queue, _log_listener, cleanup_thread
+    _log_queue = queue.Queue(-1)
+    _log_queue_handler.queue = _log_queue
+    _log_listener = QueueListener(_log_queue, *_log_handlers)
+    _log_listener.start()
+    cleanup_thread = threading.Thread(target=cleanup_expired_cache, daemon=True)
+    cleanup_thread.start()
+
+os.register_at_fork(after_in_child=_restart_background_threads)
+
+# The playground page is read once at import; WhiteNoise only covers /static/*
+try:
+    with open(os.path.join(app.static_folder, 'playground.html'), 'rb') as f:
+        PLAYGROUND_HTML = f.read()
+    PLAYGROUND_ETAG = hashlib.blake2b(PLAYGROUND_HTML, digest_size=8).hexdigest()
+except OSError:
+    PLAYGROUND_HTML = PLAYGROUND_ETAG = None
+
 @app.route('/')
 def index():
     """Serve the playground UI"""
-    return send_from_directory('static', 'playground.html')
+    if PLAYGROUND_HTML is None:
+        return send_from_directory('static', 'playground.html')
+    response = Response(PLAYGROUND_HTML, mimetype='text/html')
+    response.set_etag(PLAYGROUND_ETAG)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
 
 @app.route('/health')
 def health():
@@ -314,60 +791,38 @@ def health():
 @app.route('/api/stream/<video_id>')
 def get_stream(video_id):
     """Extract YouTube stream URL (GET)"""
-    if not video_id or len(video_id) < 10:
-        return jsonify({'error': 'Invalid video ID'}), 400
+    if not valid_video_id(video_id):
+        return invalid_id_response()
     
-    # Check extraction cache first
-    cached_result = get_cached_extraction(video_id)
-    is_cached = bool(cached_result)
-    result = cached_result or extract_youtube_stream(video_id)
-    
-    if result and not is_cached:
-        set_cached_extraction(video_id, result)
+    result, is_cached = get_stream_result(video_id)
     
     if result:
-        # Use cached short ID instead of full base64 encoding
-        stream_url = result.get('url', '')
-        if stream_url:
-            cache_id = cache_stream_url(stream_url)
-            result['proxy_url'] = f"/stream/play?id={cache_id}"
-            result['cache_id'] = cache_id
+        if result.get('cache_id'):
             result['cached'] = is_cached
         
         # Add cache headers
         cache_control = 'public, max-age=3600' if is_cached else 'public, max-age=300'
+        etag = hashlib.blake2b(result.get('url', '').encode(), digest_size=8).hexdigest()
+        if request.if_none_match.contains(etag):
+            return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': cache_control}
         response = jsonify(result)
+        response.set_etag(etag)
         response.headers['Cache-Control'] = cache_control
         response.headers['X-Cache'] = 'HIT' if is_cached else 'MISS'
         return response
     else:
-        return jsonify({
-            'error': 'Failed to extract stream',
-            'video_id': video_id,
-            'reason': 'Video may be unavailable, require authentication, or need JavaScript runtime support'
-        }), 400
+        return json_error(ERR_EXTRACT_FAILED_TMPL % json.dumps(video_id).encode(), 400)
 
 @app.route('/stream/<video_id>', methods=['GET', 'POST'])
 def stream_handler(video_id):
     """Extract YouTube stream URL (supports both GET and POST)"""
-    if not video_id or len(video_id) < 10:
-        return jsonify({'error': 'Invalid video ID'}), 400
-    
-    # Check extraction cache first
-    cached_result = get_cached_extraction(video_id)
-    is_cached = bool(cached_result)
-    result = cached_result or extract_youtube_stream(video_id)
+    if not valid_video_id(video_id):
+        return invalid_id_response()
     
-    if result and not is_cached:
-        set_cached_extraction(video_id, result)
+    result, is_cached = get_stream_result(video_id)
     
     if result:
-        # Use cached short ID instead of full base64 encoding
-        stream_url = result.get('url', '')
-        if stream_url:
-            cache_id = cache_stream_url(stream_url)
-            result['proxy_url'] = f"/stream/play?id={cache_id}"
-            result['cache_id'] = cache_id
+        if result.get('cache_id'):
             result['cached'] = is_cached
             result['message'] = f"Video extracted successfully. Use proxy_url for server-side streaming."
         
@@ -378,22 +833,18 @@ def stream_handler(video_id):
         response.headers['X-Cache'] = 'HIT' if is_cached else 'MISS'
         return response, 200
     else:
-        return jsonify({
-            'error': 'Failed to extract stream',
-            'video_id': video_id,
-            'reason': 'Video may be unavailable, require authentication, or need JavaScript runtime support'
-        }), 400
+        return json_error(ERR_EXTRACT_FAILED_TMPL % json.dumps(video_id).encode(), 400)
 
 @app.route('/api/proxy/<video_id>')
 def proxy_stream(video_id):
     """Proxy YouTube stream through server (for CORS and playback support) - DEPRECATED"""
-    if not video_id or len(video_id) < 10:
-        return jsonify({'error': 'Invalid video ID'}), 400
+    if not valid_video_id(video_id):
+        return invalid_id_response()
     
     try:
         result = extract_youtube_stream(video_id)
         if not result or not result.get('url'):
-            return jsonify({'error': 'Failed to extract stream'}), 400
+            return json_error(ERR_EXTRACT_FAILED, 400)
         
         stream_url = result['url']
         response = requests.get(stream_url, stream=True, timeout=30)
@@ -448,26 +899,42 @@ def stream_play():
     
     try:
         log(f'🔄 Proxying stream from: {stream_url[:80]}...')
-        response = requests.get(stream_url, stream=True, timeout=60)
+        if stream_client is not None:
+            response = stream_client.send(stream_client.build_request('GET', stream_url), stream=True)
+            raw_chunks = response.iter_raw(STREAM_CHUNK_SIZE)
+        else:
+            response = stream_session.get(stream_url, stream=True, timeout=60)
+            raw_chunks = response.raw.stream(STREAM_CHUNK_SIZE, decode_content=False)
         
         if response.status_code != 200:
             log(f'❌ Stream error: {response.status_code}')
+            response.close()
             return jsonify({'error': f'Stream error: {response.status_code}'}), 502
         
         log(f'✅ Streaming video...')
         
-        # Stream the response back to the client
+        # Stream the response back to the client; under the gevent worker each
+        # blocked read yields, so one slow stream no longer pins a worker
+        # Raw 256 KB reads skip chunk reassembly/decoding; bytes are relayed
+        # as-is, so Content-Length/Content-Encoding pass through unchanged
         def generate():
-                if chunk:
-                    yield chunk
+            try:
+                for chunk in raw_chunks:
+                    if chunk:
+                        yield chunk
+            finally:
+                response.close()
         
-        return generate(), 200, {
+        headers = {
             'Content-Type': response.headers.get('content-type', 'video/mp4'),
-            'Content-Length': response.headers.get('content-length', ''),
             'Accept-Ranges': 'bytes',
             'Cache-Control': 'public, max-age=3600',
             'Access-Control-Allow-Origin': '*'
         }
+        for name in ('Content-Length', 'Content-Encoding'):
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        return Response(stream_with_context(generate())), 200, headers
     except Exception as e:
         log(f'❌ Stream proxy error: {str(e)}')
         return jsonify({'error': 'Stream failed', 'message': str(e)}), 500
@@ -482,14 +949,47 @@ def search():
     limit = min(int(request.args.get('limit', 5)), 20)
     results = search_youtube(query, limit=limit)
     
+    # ?resolve=1 also extracts every result's stream URL (concurrently)
+    if request.args.get('resolve') in ('1', 'true') and results:
+        streams = resolve_streams([item['videoId'] for item in results])
+        results = [
+            dict(item, stream_url=stream.get('url'), proxy_url=stream.get('proxy_url')) if stream else item
+            for item, (stream, _) in zip(results, streams)
+        ]
+    
     return jsonify({'results': results, 'count': len(results)})
 
+@app.route('/api/batch/stream')
+def batch_stream():
+    """Extract stream URLs for several videos at once (?ids=a,b,c)"""
+    video_ids = list(dict.fromkeys(v for v in request.args.get('ids', '').split(',') if v))
+    if not video_ids:
+        return jsonify({'error': 'Missing ids parameter'}), 400
+    if len(video_ids) > BATCH_MAX_IDS:
+        return jsonify({'error': f'Too many ids (max {BATCH_MAX_IDS})'}), 400
+    
+    valid_ids = [v for v in video_ids if valid_video_id(v)]
+    streams = dict(zip(valid_ids, resolve_streams(valid_ids)))
+    
+    results = []
+    for video_id in video_ids:
+        result, is_cached = streams.get(video_id, (None, False))
+        if result:
+            result['cached'] = is_cached
+            results.append(result)
+        elif video_id in streams:
+            results.append({'videoId': video_id, 'error': 'Failed to extract stream'})
+        else:
+            results.append({'videoId': video_id, 'error': 'Invalid video ID'})
+    
+    succeeded = sum(1 for r in results if 'error' not in r)
+    log(f'📦 Batch extracted {succeeded}/{len(video_ids)} videos')
+    return jsonify({'results': results, 'count': succeeded})
+
 @app.route('/api/status')
 def status():
     """API status endpoint"""
-    import shutil
-    
-    node_available = bool(shutil.which('node'))
+    node_available = bool(NODE_PATH)
     cookies_path = extractor.get_cookie_file_path()
     cookies_available = bool(cookies_path)
     
@@ -518,19 +1018,17 @@ def serve_static(filename):
 
 @app.errorhandler(404)
 def not_found(e):
-    return jsonify({'error': 'Not found'}), 404
+    return json_error(ERR_NOT_FOUND, 404)
 
 @app.errorhandler(500)
 def server_error(e):
-    return jsonify({'error': 'Server error'}), 500
+    return json_error(ERR_SERVER, 500)
 
 if __name__ == '__main__':
-    import shutil
-    
     log(f'🚀 Starting YouTube Stream API on port {PORT}')
     log(f'📁 Working directory: {os.getcwd()}')
     log(f'🔍 Directory contents: {os.listdir(".")[:10]}')
-    log(f'Node.js available: {bool(shutil.which("node"))}')
+    log(f'Node.js available: {bool(NODE_PATH)}')
     
     # Debug: List files in key locations
     for debug_path in ['/app', '/app/static', '/tmp']:
@@ -549,6 +1047,24 @@ if __name__ == '__main__':
     
     # Use gunicorn in production, Flask dev server otherwise
     if os.environ.get('ENV') == 'production':
-        os.system(f'gunicorn --bind 0.0.0.0:{PORT} --workers 2 --timeout 120 app:app')
+        # Run the gunicorn arbiter in this process: the already-imported app
+        # (yt_dlp loaded, cookies resolved) is served directly, i.e. preloaded,
+        # with no shell, re-exec or second import of this module
+        from gunicorn.app.base import BaseApplication
+        
+        class StandaloneApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f'0.0.0.0:{PORT}')
+                self.cfg.set('workers', 2)
+                # Async workers so a blocked upstream stream doesn't pin a whole worker
+                self.cfg.set('worker_class', os.environ.get('WORKER_CLASS', 'gevent'))
+                self.cfg.set('worker_connections', 1000)
+                self.cfg.set('timeout', 120)
+                self.cfg.set('preload_app', True)
+            
+            def load(self):
+                return app
+        
+        StandaloneApplication().run()
     else:
         app.run(host='0.0.0.0', port=PORT, debug=False)
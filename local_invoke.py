@@ -1,16 +1,23 @@
 import sys, json
+from functools import cache
 from pathlib import Path
-# Ensure project root on sys.path
-proj_root = Path(__file__).resolve().parent
-sys.path.insert(0, str(proj_root))
-# Import main handler
-from packages.default.serverless_handler import __main__ as handler
+# Ensure project root on sys.path (once, even if this module is re-imported)
+proj_root = str(Path(__file__).resolve().parent)
+if proj_root not in sys.path:
+    sys.path.insert(0, proj_root)
+
+
+@cache
+def load_handler():
+    """Import the main handler once; repeated invoke() calls reuse it"""
+    from packages.default.serverless_handler import __main__ as handler
+    return handler
 
 
 def invoke(path):
     event = {"http": {"path": path, "method": "GET"}}
     try:
-        res = handler.main(event, None)
+        res = load_handler().main(event, None)
         print(json.dumps({"path": path, "result": res}, indent=2, ensure_ascii=False))
     except Exception as e:
         print(json.dumps({"path": path, "exception": str(e)}))
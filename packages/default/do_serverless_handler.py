@@ -5,19 +5,46 @@ Replaces previous serverless_handler.py with improved implementation
 """
 import json
 import os
+import re
+import shutil
 import sys
+import threading
 
-# Add parent directory to path to import youtube_extractor
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add parent directory to path to import youtube_extractor (once, not on every re-import)
+_PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _PARENT_DIR not in sys.path:
+    sys.path.insert(0, _PARENT_DIR)
 
-from youtube_extractor import YoutubeExtractor
+REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', '45'))  # Serverless has tighter timeout
 
-# Initialize extractor with timeout suitable for serverless
-extractor = YoutubeExtractor(
-    cookies_file=os.environ.get('COOKIES_FILE'),
-    timeout=int(os.environ.get('REQUEST_TIMEOUT', '45')),  # Serverless has tighter timeout
-    log_func=lambda msg: print(f"[DO-Serverless] {msg}", flush=True)
-)
+def log(msg):
+    print(f"[DO-Serverless] {msg}", flush=True)
+
+# The extractor (and with it the yt_dlp import) is created on the first
+# search/extract call, so cold starts that only answer 'status' stay fast
+_extractor = None
+_extractor_lock = threading.Lock()
+
+def _ext():
+    """Return the shared YoutubeExtractor, initializing it on first use"""
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                from youtube_extractor import YoutubeExtractor
+                _extractor = YoutubeExtractor(
+                    cookies_file=os.environ.get('COOKIES_FILE'),
+                    timeout=REQUEST_TIMEOUT,
+                    log_func=log
+                )
+    return _extractor
+
+def _warmup():
+    """Initialize the extractor in the background (imports yt_dlp ahead of the first request)"""
+    threading.Thread(target=_ext, name='extractor-warmup', daemon=True).start()
+
+# YouTube video IDs: exactly 11 characters of [A-Za-z0-9_-]
+VIDEO_ID_RE = re.compile(r'[A-Za-z0-9_-]{11}')
 
 def main(args):
     """
@@ -29,10 +56,14 @@ def main(args):
     Usage:
         {'action': 'search', 'query': 'baby', 'limit': 10}
         {'action': 'extract', 'video_id': 'dQw4w9WgXcQ'}
+        {'action': 'status', 'warmup': True}  # also pre-loads yt_dlp in the background
     """
     try:
         action = args.get('action', 'status').lower()
         
+        if args.get('warmup') and _extractor is None:
+            _warmup()
+        
         if action == 'status':
             return handle_status()
         
@@ -53,18 +84,22 @@ def main(args):
             }
     
     except Exception as e:
-        extractor.log(f'❌ Handler error: {e}')
+        log(f'❌ Handler error: {e}')
         return {
             'error': str(e),
             'type': type(e).__name__
         }
 
 def handle_status():
-    """Return API status and capabilities"""
-    import shutil
-    
+    """Return API status and capabilities (without initializing the extractor)"""
     node_available = bool(shutil.which('node'))
-    cookies_path = extractor.get_cookie_file_path()
+    if _extractor is not None:
+        cookies_available = bool(_extractor.get_cookie_file_path())
+    else:
+        cookies_available = bool(os.environ.get('YTDLP_COOKIES')) or any(
+            path and os.path.exists(path)
+            for path in (os.environ.get('COOKIES_FILE'), '/app/cookies.txt', '/tmp/cookies.txt', 'cookies.txt')
+        )
     
     return {
         'service': 'YouTube Extractor (DigitalOcean Serverless)',
@@ -74,10 +109,10 @@ def handle_status():
             'search': True,
             'extract': True,
             'node_js': node_available,
-            'cookies': bool(cookies_path)
+            'cookies': cookies_available
         },
         'limits': {
-            'timeout_seconds': extractor.timeout,
+            'timeout_seconds': REQUEST_TIMEOUT,
             'max_search_results': 50
         }
     }
@@ -90,6 +125,7 @@ def handle_search(args):
     
     limit = min(int(args.get('limit', 10)), 50)  # Cap at 50 for serverless
     
+    extractor = _ext()
     extractor.log(f'🔍 Searching: {query} (limit: {limit})')
     results = extractor.search_youtube(query, limit=limit)
     
@@ -104,9 +140,10 @@ def handle_extract(args):
     """Handle extract/stream action"""
     video_id = args.get('video_id') or args.get('id')
     
-    if not video_id or len(video_id) < 10:
+    if not video_id or not VIDEO_ID_RE.fullmatch(str(video_id)):
         return {'error': 'Invalid or missing video_id parameter'}
     
+    extractor = _ext()
     extractor.log(f'🎬 Extracting: {video_id}')
     result = extractor.extract_youtube_stream(video_id)
     
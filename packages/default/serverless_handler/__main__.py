@@ -1,703 +1,1189 @@
+import atexit
+import base64
+import importlib.util
 import json
+import mimetypes
 import os
+import re
+import shutil
+import stat
 import subprocess
-from datetime import datetime
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 # Minimal handler following DigitalOcean Functions Python runtime guide
 # Exposes `main(event, context)` which receives event dict and context object
 
 LOG_DIR = os.environ.get('LOG_DIR', '/tmp/proxyLogs')
-os.makedirs(LOG_DIR, exist_ok=True)
-import sys
+# Minimum level written by _log, on the `logging` scale (10=DEBUG, 20=INFO, 30=WARNING,
+# 40=ERROR); per-request chatter is DEBUG so the default INFO level skips it
+_LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+_LOG_LEVEL = os.environ.get('LOG_LEVEL', '20').upper()
+_LOG_LEVEL = int(_LOG_LEVEL) if _LOG_LEVEL.isdigit() else _LOG_LEVELS.get(_LOG_LEVEL, 20)
+
+# Settings read once per container rather than on every request
+_YT_DLP_PATH = os.environ.get('YT_DLP_PATH', 'yt-dlp')
+_COOKIES_FILE = os.environ.get('COOKIES_FILE', '/tmp/cookies.txt')
+_REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', '45'))
+_PKG_DIR = os.path.dirname(os.path.abspath(__file__))
+_LOCAL_COOKIES = os.path.join(_PKG_DIR, 'cookies.txt')
+
+# Verbose diagnostic yt-dlp command (URL goes between prefix and args): the
+# YT_DLP_PATH binary when it resolves, `python -m yt_dlp` otherwise
+_YTDLP_BIN = shutil.which(_YT_DLP_PATH)
+_YTDLP_DIAG_PREFIX = [_YTDLP_BIN] if _YTDLP_BIN else [sys.executable, '-m', 'yt_dlp']
+_YTDLP_DIAG_ARGS = [
+    "--no-cache-dir",
+    "--no-check-certificate",
+    "--dump-single-json",
+    "--no-playlist",
+    "-f",
+    "best[ext=mp4]/best",
+    "-v"
+]
+
+# The cookies lookup (package-local file first, then COOKIES_FILE) is re-stat'ed
+# at most this often; the file may be dropped into /tmp after start-up
+_COOKIES_RECHECK_INTERVAL = 30
+_cookies_state = {'checked_at': None, 'path': _COOKIES_FILE, 'exists': False}
+
+# Log lines go to stdout and to startup.log (opened once and shared by every
+# invocation) without a flush per line: both are flushed once when main()
+# returns, right away for errors, and at exit. Flushing per invocation rather
+# than from a background writer means nothing sits buffered while the
+# container is frozen between requests. LOG_DIR is only created for this
+# open, and a read-only filesystem just leaves stdout logging.
+_log_lock = threading.Lock()
+# Lines below LOG_LEVEL are kept, unformatted, in a ring of the most recent
+# LOG_BUFFER entries and only written out when an invocation fails (raises or
+# returns a 5xx); main() clears it at the start of each invocation
+_LOG_RING = deque(maxlen=int(os.environ.get('LOG_BUFFER', '256')))
+try:
+    if not os.path.isdir(LOG_DIR):  # warm containers already have it; skip the EEXIST mkdir
+        os.makedirs(LOG_DIR, exist_ok=True)
+    _LOG_FH = open(os.path.join(LOG_DIR, 'startup.log'), 'a', buffering=8192)
+    atexit.register(_LOG_FH.close)
+except OSError:
+    _LOG_FH = None
+
+# The strftime'd seconds part of the last timestamp, rebuilt only when the
+# second changes: (epoch second, 'YYYY-MM-DDTHH:MM:SS')
+_ts_cache = (None, '')
+
+def _timestamp(t=None):
+    """UTC time t (default now) as ISO 8601 with microseconds and a 'Z' suffix"""
+    global _ts_cache
+    if t is None:
+        t = time.time()
+    sec = int(t)
+    cached_sec, prefix = _ts_cache
+    if sec != cached_sec:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(sec))
+        _ts_cache = (sec, prefix)
+    return prefix + f'.{int(t % 1 * 1e6):06d}Z'
+
+def _log(fmt, *args, lvl=20):
+    """Log fmt % args; arguments are only formatted if the line is emitted
+
+    List arguments (commands) are rendered space-joined. Lines below LOG_LEVEL
+    go to _LOG_RING instead.
+    """
+    if lvl < _LOG_LEVEL:
+        # Lists (commands) are copied, as callers may extend them afterwards
+        _LOG_RING.append((time.time(), fmt, tuple(a[:] if isinstance(a, list) else a for a in args)))
+        return
+    _write_log(_format_log(time.time(), fmt, args), lvl)
+
+def _format_log(t, fmt, args):
+    """Render one log line logged at time t"""
+    if args:
+        fmt = fmt % tuple(' '.join(a) if isinstance(a, list) else a for a in args)
+    return f"[{_timestamp(t)}] {fmt}\n"
+
+def _write_log(line, lvl=20):
+    """Append a rendered line to stdout and startup.log, flushing for errors"""
+    try:
+        with _log_lock:
+            sys.stdout.write(line)
+            if _LOG_FH is not None:
+                _LOG_FH.write(line)
+        if lvl >= 40:
+            _flush_log()
+    except Exception:
+        pass
 
-def _log(msg):
-    ts = datetime.utcnow().isoformat() + 'Z'
-    line = f"[{ts}] {msg}"
+def _emit_log_ring():
+    """Write out (and clear) the buffered below-level lines of this invocation"""
     try:
-        print(line, flush=True)
-        with open(os.path.join(LOG_DIR, 'startup.log'), 'a') as f:
-            f.write(line + '\n')
+        while _LOG_RING:
+            _write_log(_format_log(*_LOG_RING.popleft()))
     except Exception:
         pass
 
+def _flush_log():
+    """Flush buffered log lines to stdout and startup.log"""
+    try:
+        with _log_lock:
+            sys.stdout.flush()
+            if _LOG_FH is not None:
+                _LOG_FH.flush()
+    except Exception:
+        pass
+
+# Registered after _LOG_FH.close, so it runs before it
+atexit.register(_flush_log)
+
+def _cookies_file():
+    """Return (path, exists) for the cookies file extraction should use"""
+    now = time.monotonic()
+    state = _cookies_state
+    if state['checked_at'] is None or now - state['checked_at'] >= _COOKIES_RECHECK_INTERVAL:
+        if os.path.exists(_LOCAL_COOKIES):
+            state['path'], state['exists'] = _LOCAL_COOKIES, True
+        else:
+            state['path'], state['exists'] = _COOKIES_FILE, os.path.exists(_COOKIES_FILE)
+        state['checked_at'] = now
+    return state['path'], state['exists']
+
+# Per-container results of the filesystem probing done for extraction (Deno
+# binary, subprocess env with vendor dirs on PYTHONPATH), filled on first use.
+# Neither changes during a warm container's lifetime; the debug endpoints
+# still probe live.
+_RESOLVED = {}
+
+def _stat_or_none(path):
+    """os.stat(path), or None if it can't be stat'ed"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+def _is_executable_file(st):
+    """True for a stat result of a regular file with an execute bit set"""
+    return st is not None and stat.S_ISREG(st.st_mode) and bool(st.st_mode & 0o111)
+
+def _find_deno():
+    """Locate a Deno binary (ensure_deno() if the helper module has it, else known paths/PATH)"""
+    deno_path = None
+    try:
+        # Try importing ensure_deno from serverless_handler_local
+        try:
+            from serverless_handler_local import ensure_deno
+            deno_path = ensure_deno()
+        except ImportError:
+            # Fallback: check common locations only (no download)
+            deno_candidates = [
+                os.path.join(_PKG_DIR, 'vendor', 'bin', 'deno'),
+                '/tmp/vendor/bin/deno',
+                os.path.join(os.getcwd(), 'vendor', 'bin', 'deno'),
+                '/tmp/deno/deno'
+            ]
+            for candidate in deno_candidates:
+                if _is_executable_file(_stat_or_none(candidate)):
+                    deno_path = candidate
+                    break
+            if not deno_path:
+                deno_path = shutil.which('deno')
+    except Exception as de:
+        _log(f'Error checking for Deno: {de}')
+    return deno_path
+
+def _deno_path():
+    """Cached _find_deno()"""
+    if 'deno_path' not in _RESOLVED:
+        _RESOLVED['deno_path'] = _find_deno()
+    return _RESOLVED['deno_path']
+
+def _vendor_env():
+    """os.environ copy with any vendor site-packages dirs prepended to PYTHONPATH"""
+    env = os.environ.copy()
+    existing_pp = env.get('PYTHONPATH', '')
+    vendor_paths = []
+    for p in ['/tmp/vendor', '/tmp/vendor/lib/python3.11/site-packages', '/tmp/.local/lib/python3.11/site-packages']:
+        try:
+            if os.path.isdir(p):
+                vendor_paths.append(p)
+        except Exception:
+            continue
+    new_pp = os.pathsep.join(vendor_paths) if vendor_paths else ''
+    if new_pp and existing_pp:
+        env['PYTHONPATH'] = new_pp + os.pathsep + existing_pp
+    elif new_pp:
+        env['PYTHONPATH'] = new_pp
+    else:
+        env['PYTHONPATH'] = existing_pp
+    return env
+
+def _extraction_env():
+    """Cached _vendor_env() for the subprocesses that import yt_dlp"""
+    if 'pythonpath_env' not in _RESOLVED:
+        _RESOLVED['pythonpath_env'] = _vendor_env()
+    return _RESOLVED['pythonpath_env']
+
 # Do not add vendor dirs to sys.path; rely on packages installed from requirements
 # and prefer subprocess 'yt-dlp' for stream extraction as in `simple_proxy.py`.
 
 # Keep a minimal check for /tmp/vendor presence for backward compatibility
 vendor_candidates = [
     '/tmp/vendor',
-    os.path.join(os.path.dirname(__file__), 'vendor')
+    os.path.join(_PKG_DIR, 'vendor')
 ]
 for vc in vendor_candidates:
     try:
         vc_abs = os.path.abspath(vc)
-        _log(f'Checked vendor candidate: {vc_abs} exists={os.path.isdir(vc_abs)}')
+        _log('Checked vendor candidate: %s exists=%s', vc_abs, os.path.isdir(vc_abs), lvl=10)
     except Exception as e:
         _log(f'Error checking vendor candidate {vc}: {e}')
 
-def main(event=None, context=None):
-    """Entry point for DigitalOcean Functions (event, context)
 
-    Handles a few simple paths for validation:
-      - /health -> returns status
-      - /hello -> returns a small JSON message
-    """
-    _log('main invoked')
-    # event may be None for non-http calls
-    path = None
-    method = 'GET'
-    if event and isinstance(event, dict):
-        http = event.get('http') or {}
-        path = http.get('path')
-        method = http.get('method', method)
+# Successful extractions (video_id -> (expires_at, result)) and searches
+# ((query, limit) -> (expires_at, results)), LRU-bounded, so replays on a warm
+# container skip yt-dlp; signed stream URLs last ~6h
+_STREAM_CACHE_TTL = int(os.environ.get('STREAM_CACHE_TTL', '300'))
+_SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '900'))
+_RESULT_CACHE_MAX_ENTRIES = 256
+_STREAM_CACHE = OrderedDict()
+_SEARCH_CACHE = OrderedDict()
+_RESULT_CACHE_LOCK = threading.Lock()
 
-    # Default behavior: health
-    if not path or path == '/health':
-        _log('returning health')
-        return {"body": {"status": "healthy", "service": "youtube-stream-url"}, "statusCode": 200}
 
-    if path == '/hello':
-        _log('returning hello')
-        return {"body": {"message": "hello from serverless_handler"}, "statusCode": 200}
+def _cache_get(cache, key):
+    """Return the unexpired cached value for key, or None"""
+    with _RESULT_CACHE_LOCK:
+        cached = cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            cache.move_to_end(key)
+            return cached[1]
+        cache.pop(key, None)
+    return None
 
-    # Serve playground UI and static assets
-    if path == '/playground':
-        try:
-            static_dir = os.path.join(os.path.dirname(__file__), 'static')
-            p = os.path.join(static_dir, 'playground.html')
-            with open(p, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return {"body": content, "statusCode": 200, "headers": {"Content-Type": "text/html; charset=utf-8"}}
-        except Exception as e:
-            _log(f'playground serve error: {e}')
-            return {"body": {"error": "Could not serve playground"}, "statusCode": 500}
-
-    if path and ('/static/' in path):
+
+def _cache_put(cache, key, value, ttl):
+    """Store value for ttl seconds (no-op when ttl <= 0), evicting the LRU entry"""
+    if ttl <= 0:
+        return
+    with _RESULT_CACHE_LOCK:
+        cache[key] = (time.monotonic() + ttl, value)
+        cache.move_to_end(key)
+        while len(cache) > _RESULT_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+# Extractor/search callables, resolved once per container and reused by every
+# warm invocation (the import ladder below only runs on first use)
+_EXTRACTOR = None
+_SEARCH = None
+_RESOLVE_LOCK = threading.Lock()
+
+# Where serverless_handler_local.py may live depending on how the function was
+# packaged; absolute paths computed once, the first hit is remembered
+_CANDIDATES = [os.path.abspath(p) for p in (
+    os.path.join(_PKG_DIR, '..', 'serverless_handler_local.py'),
+    os.path.join(_PKG_DIR, '..', '..', 'serverless_handler_local.py'),
+    os.path.join(os.getcwd(), 'serverless_handler_local.py'),
+    os.path.join(os.getcwd(), 'packages', 'default', 'serverless_handler_local.py'),
+    os.path.join(os.getcwd(), 'packages', 'default', 'serverless_handler', 'serverless_handler_local.py'),
+    os.path.join(_PKG_DIR, 'serverless_handler_local.py')
+)]
+_FOUND_PATH = None
+
+
+def _find_local_module():
+    """Return the first existing serverless_handler_local.py candidate (stat'ed only until found)"""
+    global _FOUND_PATH
+    if _FOUND_PATH is None:
+        _FOUND_PATH = next((p for p in _CANDIDATES if os.path.exists(p)), None)
+    return _FOUND_PATH
+
+
+# YoutubeDL instances for the inline fallbacks, one per distinct option set and
+# thread (an instance isn't safe to share between concurrent extractions), so
+# warm requests skip extractor registration and re-reading cookies/options
+_YDLS = threading.local()
+
+
+def _get_ydl(opts):
+    """Return this thread's yt_dlp.YoutubeDL for these options, creating it on first use"""
+    key = json.dumps(opts, sort_keys=True)
+    ydls = getattr(_YDLS, 'by_opts', None)
+    if ydls is None:
+        ydls = _YDLS.by_opts = {}
+    ydl = ydls.get(key)
+    if ydl is None:
+        import yt_dlp
+        ydl = ydls[key] = yt_dlp.YoutubeDL(opts)
+    return ydl
+
+
+# The inline fallbacks run on these threads so an invocation gives up after
+# _REQUEST_TIMEOUT with a clean error instead of running until the platform
+# kills it (socket_timeout only bounds single reads); a timed-out call
+# finishes in the background
+_INLINE_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get('YT_CONCURRENCY', '4')),
+                                  thread_name_prefix='ytdlp-inline')
+
+
+def _extract_info(opts, url):
+    """_get_ydl(opts).extract_info(url) on _INLINE_POOL; FutureTimeout past _REQUEST_TIMEOUT"""
+    return _INLINE_POOL.submit(lambda: _get_ydl(opts).extract_info(url, download=False)).result(_REQUEST_TIMEOUT)
+
+
+def _inline_extract_youtube_stream(video_id):
+    """Fallback extractor used when serverless_handler_local cannot be loaded"""
+    try:
+        youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+        # In-process yt_dlp: no interpreter start-up or JSON round-trip per request
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'cachedir': False,
+            'nocheckcertificate': True,
+            'noplaylist': True,
+            'format': 'best[ext=mp4][protocol^=http]/best[protocol^=http]',
+            'socket_timeout': _REQUEST_TIMEOUT,
+        }
+
+        # Check for Deno JS runtime - attempt to get or download
+        deno_path = _deno_path()
+
+        if deno_path:
+            ydl_opts['js_runtimes'] = {'deno': {'path': deno_path}}
+            _log('🦕 Deno runtime (inline): %s', deno_path, lvl=10)
+
+        # Check local package directory first for cookies
+        cookies, cookies_exist = _cookies_file()
+        if cookies_exist:
+            ydl_opts['cookiefile'] = cookies
+            _log("✅ Using cookies (inline): %s", cookies, lvl=10)
+            _log("🍪 Cookies enabled for this request", lvl=10)
+        else:
+            _log("⚠️ No cookies file (inline): %s", cookies, lvl=10)
+        _log("Running (inline yt_dlp): %s", youtube_url, lvl=10)
+        import yt_dlp
         try:
-            # Normalize: find the first occurrence of /static/ to support prefixes like
-            # /default/serverless_handler/static/playground.js
-            idx = path.find('/static/')
-            rel = path[idx + len('/static/'):]
-            static_dir = os.path.join(os.path.dirname(__file__), 'static')
-            # Prevent path traversal
-            target = os.path.abspath(os.path.join(static_dir, rel))
-            if not target.startswith(os.path.abspath(static_dir)) or not os.path.exists(target):
-                return {"body": {"error": "Not found"}, "statusCode": 404}
-            import mimetypes
-            mime, _ = mimetypes.guess_type(target)
-            mime = mime or 'application/octet-stream'
-            mode = 'rb' if not mime.startswith('text/') else 'r'
-            with open(target, mode, encoding='utf-8' if mode=='r' else None) as f:
-                data = f.read()
-            headers = {"Content-Type": mime}
-            return {"body": data, "statusCode": 200, "headers": headers}
-        except Exception as e:
-            _log(f'static serve error: {e}')
+            data = _extract_info(ydl_opts, youtube_url)
+        except yt_dlp.utils.DownloadError as e:
+            _log(f"yt-dlp error: {str(e)[:200]}")
+            return None
+        except FutureTimeout:
+            _log(f'Inline extraction timeout ({_REQUEST_TIMEOUT}s) for {video_id}')
+            return None
+        stream_url = data.get('url')
+        if not stream_url:
+            _log('No URL found in yt-dlp output (inline)')
+            return None
+        return {
+            'title': data.get('title', 'Unknown'),
+            'url': stream_url,
+            'thumbnail': data.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"),
+            'duration': str(data.get('duration', 0)),
+            'uploader': data.get('uploader', 'Unknown'),
+            'id': video_id,
+            'videoId': video_id,
+            'format_id': data.get('format_id'),
+            'ext': data.get('ext', 'mp4')
+        }
+    except Exception as e:
+        _log(f'Inline extraction error: {e}')
+        return None
+
+
+def _get_extractor():
+    """Return extract_youtube_stream from serverless_handler_local, resolving it once
+
+    Tries a normal import, then loads the module by file path, then falls back to
+    the inline extractor if the helper module was not packaged.
+    """
+    if _EXTRACTOR is not None:
+        return _EXTRACTOR
+    with _RESOLVE_LOCK:
+        if _EXTRACTOR is None:
+            _resolve_extractor()
+    return _EXTRACTOR
+
+
+def _resolve_extractor():
+    global _EXTRACTOR
+    try:
+        from serverless_handler_local import extract_youtube_stream as _ext
+        _EXTRACTOR = _ext
+        return _EXTRACTOR
+    except Exception:
+        pass
+    # Fallback: load by file path using importlib
+    try:
+        found = _find_local_module()
+        if not found:
+            # Fallback: use the inline extractor so the function can run even if the
+            # helper module was not packaged correctly.
+            _log('serverless_handler_local.py not found; using inline extractor')
+            _EXTRACTOR = _inline_extract_youtube_stream
+        else:
+            spec = importlib.util.spec_from_file_location('sh_local', found)
+            shl = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(shl)
+            _EXTRACTOR = shl.extract_youtube_stream
+    except Exception as e:
+        _log(f'Import error: {e}')
+        raise
+
+
+def _extract_stream(video_id):
+    """Run the resolved extractor, serving repeat IDs from _STREAM_CACHE"""
+    cached = _cache_get(_STREAM_CACHE, video_id)
+    if cached is not None:
+        _log('stream cache hit for %s', video_id, lvl=10)
+        return dict(cached)
+    result = _get_extractor()(video_id)
+    if result:
+        _cache_put(_STREAM_CACHE, video_id, dict(result), _STREAM_CACHE_TTL)
+    return result
+
+
+def _search_results(query, limit):
+    """Run the resolved search, serving repeat (query, limit) pairs from _SEARCH_CACHE"""
+    key = (query, limit)
+    cached = _cache_get(_SEARCH_CACHE, key)
+    if cached is not None:
+        _log('search cache hit for "%s"', query, lvl=10)
+        return list(cached)
+    results = _get_search()(query, limit)
+    # Empty lists are also what the searches return on errors; don't pin those
+    if results:
+        _cache_put(_SEARCH_CACHE, key, list(results), _SEARCH_CACHE_TTL)
+    return results
+
+
+def _inline_search_youtube(query, limit=5):
+    """Fallback search used when serverless_handler_local has no search_youtube"""
+    try:
+        ydl_opts = {'quiet': True, 'skip_download': True, 'nocheckcertificate': True}
+        data = _extract_info(ydl_opts, f"ytsearch{limit}:{query}")
+        entries = data.get('entries', []) if isinstance(data, dict) else []
+        results = []
+        for e in entries:
+            results.append({
+                'id': e.get('id'),
+                'title': e.get('title'),
+                'duration': str(e.get('duration', 0)) if e.get('duration') is not None else '0',
+                'url': f"https://www.youtube.com/watch?v={e.get('id')}",
+                'thumbnail': e.get('thumbnail')
+            })
+        return results
+    except FutureTimeout:
+        _log(f'Inline search timeout ({_REQUEST_TIMEOUT}s)')
+        return []
+    except Exception as e:
+        _log(f'Inline search error: {e}')
+        return []
+
+
+def _get_search():
+    """Return search_youtube from serverless_handler_local (or the inline search), resolved once"""
+    global _SEARCH
+    if _SEARCH is None:
+        with _RESOLVE_LOCK:
+            if _SEARCH is None:
+                try:
+                    from serverless_handler_local import search_youtube as _search
+                except Exception:
+                    _log('serverless_handler_local.search_youtube not available; using inline search')
+                    _search = _inline_search_youtube
+                _SEARCH = _search
+    return _SEARCH
+
+
+def _warm():
+    """Resolve the extractor/search and import yt_dlp ahead of the first request"""
+    try:
+        _get_extractor()
+        _get_search()
+        import yt_dlp  # noqa: F401
+    except Exception as e:
+        _log(f'warm-up error: {e}')
+    _flush_log()
+
+
+# Playground/static file contents and MIME types by absolute path; the files
+# ship with the function and don't change during a container's lifetime
+_STATIC_DIR = os.path.join(_PKG_DIR, 'static')
+_PLAYGROUND_HTML = os.path.join(_STATIC_DIR, 'playground.html')
+_STATIC_CACHE = {}
+_STATIC_CACHE_MAX_ENTRIES = 64
+# MIME types for the asset types the playground ships; mimetypes is only
+# consulted for anything else
+_MIME = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'text/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+}
+# Non-text/* types that are still served as decoded text rather than base64
+_TEXT_MIMES = ('application/javascript', 'application/json')
+mimetypes.init()
+
+
+def _read_static(target):
+    """Return (body, mime, is_base64) for a static file, reading it from disk only once
+
+    Text files (text/*, JSON, JavaScript) are decoded to str; binary files are
+    base64-encoded up front, as the Functions web runtime expects for non-text bodies.
+    """
+    entry = _STATIC_CACHE.get(target)
+    if entry is None:
+        mime = _MIME.get(os.path.splitext(target)[1])
+        if mime is None:
+            mime = mimetypes.guess_type(target)[0] or 'application/octet-stream'
+        with open(target, 'rb') as f:
+            data = f.read()
+        if mime.startswith('text/') or mime.startswith(_TEXT_MIMES):
+            entry = (data.decode('utf-8'), mime, False)
+        else:
+            entry = (base64.b64encode(data).decode('ascii'), mime, True)
+        if len(_STATIC_CACHE) < _STATIC_CACHE_MAX_ENTRIES:
+            _STATIC_CACHE[target] = entry
+    return entry
+
+
+# Path parameters: the video ID of /api/stream/{id}, and whatever follows the
+# first /static/ (which may sit under a function prefix)
+_RE_STREAM = re.compile(r'/api/stream/([^/]+)/?')
+_RE_STATIC = re.compile(r'.*?/static/(.+)', re.S)
+# YouTube video IDs; anything else is rejected before yt-dlp is started
+_RE_VIDEO_ID = re.compile(r'[A-Za-z0-9_-]{11}')
+
+
+# /health and /hello are constant: their JSON bodies are serialized once here and
+# the same response dicts are returned on every call (platform health checks hit
+# /health often)
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_HEALTH_RESP = {
+    "body": json.dumps({"status": "healthy", "service": "youtube-stream-url"}),
+    "statusCode": 200,
+    "headers": _JSON_HEADERS,
+}
+_HELLO_RESP = {
+    "body": json.dumps({"message": "hello from serverless_handler"}),
+    "statusCode": 200,
+    "headers": _JSON_HEADERS,
+}
+
+
+def _handle_health(query, path):
+    """/health (also the default for non-http invocations)"""
+    _log('returning health', lvl=10)
+    return _HEALTH_RESP
+
+
+def _handle_hello(query, path):
+    """/hello"""
+    _log('returning hello', lvl=10)
+    return _HELLO_RESP
+
+
+def _playground_page():
+    """Load playground.html as (body, headers), with its Content-Length precomputed"""
+    content, _, _ = _read_static(_PLAYGROUND_HTML)
+    headers = {
+        "Content-Type": "text/html; charset=utf-8",
+        "Content-Length": str(len(content.encode('utf-8'))),
+    }
+    return content, headers
+
+
+# The playground page is loaded at import; if that fails, /playground retries
+# (and reports the error) per request
+try:
+    _PLAYGROUND = _playground_page()
+except OSError:
+    _PLAYGROUND = None
+
+
+def _handle_playground(query, path):
+    """/playground: the playground UI"""
+    global _PLAYGROUND
+    try:
+        if _PLAYGROUND is None:
+            _PLAYGROUND = _playground_page()
+        content, headers = _PLAYGROUND
+        return {"body": content, "statusCode": 200, "headers": dict(headers)}
+    except Exception as e:
+        _log(f'playground serve error: {e}')
+        return {"body": {"error": "Could not serve playground"}, "statusCode": 500}
+
+
+def _handle_static(query, path):
+    """*/static/*: playground assets"""
+    try:
+        # Normalize: take what follows the first /static/ to support prefixes like
+        # /default/serverless_handler/static/playground.js
+        m = _RE_STATIC.match(path)
+        if not m:
             return {"body": {"error": "Not found"}, "statusCode": 404}
+        rel = m.group(1)
+        # Prevent path traversal (trailing separator so e.g. static2/ can't match);
+        # _STATIC_DIR is absolute, so normpath suffices and skips abspath's getcwd()
+        target = os.path.normpath(os.path.join(_STATIC_DIR, rel))
+        if not target.startswith(_STATIC_DIR + os.sep):
+            return {"body": {"error": "Not found"}, "statusCode": 404}
+        if target not in _STATIC_CACHE and not os.path.isfile(target):
+            return {"body": {"error": "Not found"}, "statusCode": 404}
+        data, mime, is_base64 = _read_static(target)
+        headers = {"Content-Type": mime}
+        response = {"body": data, "statusCode": 200, "headers": headers}
+        if is_base64:
+            response["isBase64Encoded"] = True
+        return response
+    except Exception as e:
+        _log(f'static serve error: {e}')
+        return {"body": {"error": "Not found"}, "statusCode": 404}
+
 
-    # Debug endpoint to inspect Python sys.path and vendor locations
-    if path and ('/debug/sys' in path):
+def _handle_debug_sys(query, path):
+    """*/debug/sys: Python sys.path and vendor locations"""
+    # Start `python -m yt_dlp --version` first and collect it last, so the
+    # filesystem probes below overlap the child's start-up
+    try:
+        proc_ver = subprocess.Popen([sys.executable, '-m', 'yt_dlp', '--version'],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        ver_err = None
+    except Exception as ver_e:
+        proc_ver, ver_err = None, ver_e
+    try:
+        vendors = [
+            os.path.join(_PKG_DIR, 'vendor'),
+            os.path.join(_PKG_DIR, '..', 'vendor'),
+            os.path.join(_PKG_DIR, '..', '..', 'vendor'),
+            os.path.join(os.getcwd(), 'vendor'),
+        ]
+        vendor_info = {}
+        for v in vendors:
+            try:
+                v_abs = os.path.abspath(v)
+                vendor_info[v_abs] = os.path.isdir(v_abs)
+            except Exception as e:
+                vendor_info[v] = f'error: {e}'
+        python_check = {
+            'sys_path': sys.path[:20],
+            'yt_dlp_importable': None,
+            'yt_dlp_location': None,
+            'yt_dlp_bin': shutil.which(_YT_DLP_PATH),
+            'site_packages_candidates': []
+        }
+        # Check common site-packages locations under /tmp that pip might have used
+        sp_candidates = [
+            '/tmp/vendor',
+            '/tmp/vendor/lib',
+            '/tmp/vendor/lib/python3.11/site-packages',
+            '/tmp/.local/lib/python3.11/site-packages',
+            '/tmp/.local/lib/python3.11/site-packages/yt_dlp',
+        ]
+        for sc in sp_candidates:
+            try:
+                python_check['site_packages_candidates'].append({sc: os.path.isdir(sc)})
+            except Exception as e:
+                python_check['site_packages_candidates'].append({sc: f'error: {e}'})
+
+        # Try import and also enumerate vendor directories if present
         try:
-            import sys
-            import shutil
-            vendors = [
-                os.path.join(os.path.dirname(__file__), 'vendor'),
-                os.path.join(os.path.dirname(__file__), '..', 'vendor'),
-                os.path.join(os.path.dirname(__file__), '..', '..', 'vendor'),
-                os.path.join(os.getcwd(), 'vendor'),
-            ]
-            vendor_info = {}
-            for v in vendors:
+            import yt_dlp as _ym
+            python_check['yt_dlp_importable'] = True
+            python_check['yt_dlp_location'] = getattr(_ym, '__file__', None)
+        except Exception as ie:
+            python_check['yt_dlp_importable'] = False
+            python_check['yt_dlp_import_error'] = str(ie)
+            # Enumerate vendor dirs to help debugging
+            vendor_listing = {}
+            for k, present in vendor_info.items():
                 try:
-                    v_abs = os.path.abspath(v)
-                    vendor_info[v_abs] = os.path.isdir(v_abs)
-                except Exception as e:
-                    vendor_info[v] = f'error: {e}'
-            python_check = {
-                'sys_path': sys.path[:20],
-                'yt_dlp_importable': None,
-                'yt_dlp_location': None,
-                'yt_dlp_bin': shutil.which(os.environ.get('YT_DLP_PATH', 'yt-dlp')),
-                'site_packages_candidates': []
-            }
-            # Check common site-packages locations under /tmp that pip might have used
-            sp_candidates = [
-                '/tmp/vendor',
-                '/tmp/vendor/lib',
-                '/tmp/vendor/lib/python3.11/site-packages',
-                '/tmp/.local/lib/python3.11/site-packages',
-                '/tmp/.local/lib/python3.11/site-packages/yt_dlp',
-            ]
-            for sc in sp_candidates:
-                try:
-                    python_check['site_packages_candidates'].append({sc: os.path.isdir(sc)})
+                    if present:
+                        vendor_listing[k] = os.listdir(k)
+                    else:
+                        vendor_listing[k] = 'not present'
                 except Exception as e:
-                    python_check['site_packages_candidates'].append({sc: f'error: {e}'})
+                    vendor_listing[k] = f'error listing: {e}'
+            python_check['vendor_listing_sample'] = vendor_listing
 
-            # Try import and also enumerate vendor directories if present
-            try:
-                import yt_dlp as _ym
-                python_check['yt_dlp_importable'] = True
-                python_check['yt_dlp_location'] = getattr(_ym, '__file__', None)
-            except Exception as ie:
-                python_check['yt_dlp_importable'] = False
-                python_check['yt_dlp_import_error'] = str(ie)
-                # Enumerate vendor dirs to help debugging
-                vendor_listing = {}
-                for k, present in vendor_info.items():
-                    try:
-                        if present:
-                            vendor_listing[k] = os.listdir(k)
-                        else:
-                            vendor_listing[k] = 'not present'
-                    except Exception as e:
-                        vendor_listing[k] = f'error listing: {e}'
-                python_check['vendor_listing_sample'] = vendor_listing
-
-            # Attempt to run the module directly to get its version (falls back to non-binary)
-            try:
-                import sys as _sys
-                proc_ver = subprocess.run([_sys.executable, '-m', 'yt_dlp', '--version'], capture_output=True, text=True, timeout=5)
-                python_check['yt_dlp_module_version'] = (proc_ver.stdout or '').strip()
-                python_check['yt_dlp_module_version_rc'] = proc_ver.returncode
-            except Exception as ver_e:
-                python_check['yt_dlp_module_version_error'] = str(ver_e)
-
-            return {"body": {"vendor_candidates": vendor_info, "python_check": python_check}, "statusCode": 200}
-        except Exception as e:
-            _log(f'debug error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
-
-    # Lightweight python import check endpoint: /debug/py
-    if path and ('/debug/py' in path):
+        # Collect the module version started above (falls back to non-binary)
         try:
+            if proc_ver is None:
+                raise ver_err
             try:
-                import yt_dlp as _ym
-                return {"body": {"yt_dlp": True, "location": getattr(_ym, '__file__', None)}, "statusCode": 200}
-            except Exception as ie:
-                return {"body": {"yt_dlp": False, "error": str(ie)}, "statusCode": 200}
-        except Exception as e:
-            _log(f'debug/py error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
-
-    # Debug endpoint to check `python -m yt_dlp --version`
-    if path and ('/debug/ytdlp_version' in path):
-        try:
-            import sys as _sys
-            env = os.environ.copy()
-            existing_pp = env.get('PYTHONPATH', '')
-            vendor_paths = []
-            for p in ['/tmp/vendor', '/tmp/vendor/lib/python3.11/site-packages', '/tmp/.local/lib/python3.11/site-packages']:
-                try:
-                    if os.path.isdir(p):
-                        vendor_paths.append(p)
-                except Exception:
-                    continue
-            new_pp = os.pathsep.join(vendor_paths) if vendor_paths else ''
-            if new_pp and existing_pp:
-                env['PYTHONPATH'] = new_pp + os.pathsep + existing_pp
-            elif new_pp:
-                env['PYTHONPATH'] = new_pp
-            else:
-                env['PYTHONPATH'] = existing_pp
+                ver_out, _ = proc_ver.communicate(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc_ver.kill()
+                proc_ver.communicate()
+                raise
+            python_check['yt_dlp_module_version'] = (ver_out or '').strip()
+            python_check['yt_dlp_module_version_rc'] = proc_ver.returncode
+        except Exception as ver_e:
+            python_check['yt_dlp_module_version_error'] = str(ver_e)
+
+        return {"body": {"vendor_candidates": vendor_info, "python_check": python_check}, "statusCode": 200}
+    except Exception as e:
+        _log(f'debug error: {e}')
+        if proc_ver is not None and proc_ver.poll() is None:
+            proc_ver.kill()
+            proc_ver.communicate()
+        return {"body": {"error": str(e)}, "statusCode": 500}
 
-            proc = subprocess.run([_sys.executable, '-m', 'yt_dlp', '--version'], capture_output=True, text=True, timeout=5, env=env)
-            return {"body": {"version": (proc.stdout or '').strip(), "rc": proc.returncode, "stderr": (proc.stderr or '').strip()}, "statusCode": 200}
-        except Exception as e:
-            _log(f'debug/ytdlp_version error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
 
-    # Debug endpoint to check cookies file status
-    if path and ('/debug/cookies' in path):
+def _handle_debug_py(query, path):
+    """*/debug/py: lightweight yt_dlp import check"""
+    try:
         try:
-            # Check local package directory first
-            _package_dir = os.path.dirname(os.path.abspath(__file__))
-            _local_cookies = os.path.join(_package_dir, 'cookies.txt')
-            
-            if os.path.exists(_local_cookies):
-                cookies_path = _local_cookies
-            else:
-                cookies_path = os.environ.get('COOKIES_FILE', '/tmp/cookies.txt')
-            
-            cookies_info = {
-                "path": cookies_path,
-                "exists": os.path.exists(cookies_path),
-                "size": None,
-                "readable": False,
-                "line_count": 0,
-                "netscape_format": False
+            import yt_dlp as _ym
+            return {"body": {"yt_dlp": True, "location": getattr(_ym, '__file__', None)}, "statusCode": 200}
+        except Exception as ie:
+            return {"body": {"yt_dlp": False, "error": str(ie)}, "statusCode": 200}
+    except Exception as e:
+        _log(f'debug/py error: {e}')
+        return {"body": {"error": str(e)}, "statusCode": 500}
+
+
+def _handle_debug_ytdlp_version(query, path):
+    """*/debug/ytdlp_version: `python -m yt_dlp --version`"""
+    try:
+        # Same cached env as the extraction runs, so the version matches what they import
+        env = _extraction_env()
+
+        proc = subprocess.run([sys.executable, '-m', 'yt_dlp', '--version'], capture_output=True, text=True, timeout=5, env=env)
+        return {"body": {"version": (proc.stdout or '').strip(), "rc": proc.returncode, "stderr": (proc.stderr or '').strip()}, "statusCode": 200}
+    except Exception as e:
+        _log(f'debug/ytdlp_version error: {e}')
+        return {"body": {"error": str(e)}, "statusCode": 500}
+
+
+def _handle_debug_cookies(query, path):
+    """*/debug/cookies: cookies file status"""
+    try:
+        # Check local package directory first (always re-checked here, not cached)
+        if os.path.exists(_LOCAL_COOKIES):
+            cookies_path = _LOCAL_COOKIES
+        else:
+            cookies_path = _COOKIES_FILE
+
+        cookies_info = {
+            "path": cookies_path,
+            "exists": os.path.exists(cookies_path),
+            "size": None,
+            "readable": False,
+            "line_count": 0,
+            "netscape_format": False
+        }
+
+        if cookies_info["exists"]:
+            try:
+                stat_info = os.stat(cookies_path)
+                cookies_info["size"] = stat_info.st_size
+                cookies_info["readable"] = os.access(cookies_path, os.R_OK)
+
+                # Validate the Netscape header from the first line and count lines
+                # in fixed-size chunks, without loading the file as a list of lines
+                with open(cookies_path, 'rb') as f:
+                    first_line = f.readline(256)
+                    line_count = first_line.count(b'\n')
+                    tail = first_line
+                    for chunk in iter(lambda: f.read(65536), b''):
+                        line_count += chunk.count(b'\n')
+                        tail = chunk
+                    if tail and not tail.endswith(b'\n'):
+                        line_count += 1  # last line without a trailing newline
+                    cookies_info["line_count"] = line_count
+                    # Netscape format starts with "# Netscape HTTP Cookie File"
+                    if b'# Netscape HTTP Cookie File' in first_line:
+                        cookies_info["netscape_format"] = True
+                    cookies_info["first_line"] = first_line.decode('utf-8', 'replace').strip()
+            except Exception as read_err:
+                cookies_info["read_error"] = str(read_err)
+
+        return {"body": cookies_info, "statusCode": 200}
+    except Exception as e:
+        _log(f'debug/cookies error: {e}')
+        return {"body": {"error": str(e)}, "statusCode": 500}
+
+
+def _handle_debug_deno(query, path):
+    """*/debug/deno: Deno JS runtime status"""
+    try:
+        deno_candidates = [
+            os.path.join(_PKG_DIR, 'vendor', 'bin', 'deno'),
+            '/tmp/vendor/bin/deno',
+            os.path.join(os.getcwd(), 'vendor', 'bin', 'deno'),
+            '/tmp/deno/deno',
+        ]
+        deno_info = {
+            "candidates_checked": [],
+            "found": False,
+            "path": None,
+            "executable": False,
+            "version": None
+        }
+
+        for candidate in deno_candidates:
+            st = _stat_or_none(candidate)
+            candidate_info = {
+                "path": candidate,
+                "exists": st is not None and stat.S_ISREG(st.st_mode),
+                "executable": _is_executable_file(st)
             }
-            
-            if cookies_info["exists"]:
+            deno_info["candidates_checked"].append(candidate_info)
+
+            if candidate_info["exists"] and candidate_info["executable"]:
+                deno_info["found"] = True
+                deno_info["path"] = candidate
+                deno_info["executable"] = True
+
+                # Try to get version
                 try:
-                    stat_info = os.stat(cookies_path)
-                    cookies_info["size"] = stat_info.st_size
-                    cookies_info["readable"] = os.access(cookies_path, os.R_OK)
-                    
-                    # Try to read first few lines to validate Netscape format
-                    with open(cookies_path, 'r') as f:
-                        lines = f.readlines()
-                        cookies_info["line_count"] = len(lines)
-                        # Netscape format starts with "# Netscape HTTP Cookie File"
-                        if lines and '# Netscape HTTP Cookie File' in lines[0]:
-                            cookies_info["netscape_format"] = True
-                        cookies_info["first_line"] = lines[0].strip() if lines else ""
-                except Exception as read_err:
-                    cookies_info["read_error"] = str(read_err)
-            
-            return {"body": cookies_info, "statusCode": 200}
-        except Exception as e:
-            _log(f'debug/cookies error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
-
-    # Debug endpoint to check Deno JS runtime status
-    if path and ('/debug/deno' in path):
-        try:
-            deno_candidates = [
-                os.path.join(os.path.dirname(__file__), 'vendor', 'bin', 'deno'),
-                '/tmp/vendor/bin/deno',
-                os.path.join(os.getcwd(), 'vendor', 'bin', 'deno'),
-                '/tmp/deno/deno',
-            ]
-            deno_info = {
-                "candidates_checked": [],
-                "found": False,
-                "path": None,
-                "executable": False,
-                "version": None
-            }
-            
-            for candidate in deno_candidates:
-                candidate_info = {
-                    "path": candidate,
-                    "exists": os.path.isfile(candidate),
-                    "executable": os.access(candidate, os.X_OK) if os.path.isfile(candidate) else False
-                }
-                deno_info["candidates_checked"].append(candidate_info)
-                
-                if candidate_info["exists"] and candidate_info["executable"]:
-                    deno_info["found"] = True
-                    deno_info["path"] = candidate
-                    deno_info["executable"] = True
-                    
-                    # Try to get version
-                    try:
-                        proc = subprocess.run([candidate, '--version'], capture_output=True, text=True, timeout=5)
-                        deno_info["version"] = (proc.stdout or '').strip()
-                        deno_info["version_rc"] = proc.returncode
-                    except Exception as ver_err:
-                        deno_info["version_error"] = str(ver_err)
-                    break
-            
-            # Also check PATH
-            if not deno_info["found"]:
-                import shutil
-                path_deno = shutil.which('deno')
-                if path_deno:
-                    deno_info["found"] = True
-                    deno_info["path"] = path_deno
-                    deno_info["executable"] = True
-                    deno_info["source"] = "PATH"
-            
-            return {"body": deno_info, "statusCode": 200}
-        except Exception as e:
-            _log(f'debug/deno error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
-
-    # Debug endpoint to test Deno download at runtime
-    if path and ('/debug/deno_download' in path):
+                    proc = subprocess.run([candidate, '--version'], capture_output=True, text=True, timeout=5)
+                    deno_info["version"] = (proc.stdout or '').strip()
+                    deno_info["version_rc"] = proc.returncode
+                except Exception as ver_err:
+                    deno_info["version_error"] = str(ver_err)
+                break
+
+        # Also check PATH
+        if not deno_info["found"]:
+            path_deno = shutil.which('deno')
+            if path_deno:
+                deno_info["found"] = True
+                deno_info["path"] = path_deno
+                deno_info["executable"] = True
+                deno_info["source"] = "PATH"
+
+        return {"body": deno_info, "statusCode": 200}
+    except Exception as e:
+        _log(f'debug/deno error: {e}')
+        return {"body": {"error": str(e)}, "statusCode": 500}
+
+
+def _handle_debug_deno_download(query, path):
+    """*/debug/deno_download: test the Deno download at runtime"""
+    try:
+        _log('Testing ensure_deno() download...')
+        from serverless_handler_local import ensure_deno
+
+        download_result = {
+            "started": True,
+            "path": None,
+            "success": False,
+            "logs": []
+        }
+
         try:
-            _log('Testing ensure_deno() download...')
-            from serverless_handler_local import ensure_deno
-            
-            download_result = {
-                "started": True,
-                "path": None,
-                "success": False,
-                "logs": []
-            }
-            
+            js_runtime = ensure_deno(timeout=45)
+            download_result["path"] = js_runtime
+            download_result["success"] = js_runtime is not None
+
+            if js_runtime:
+                # Test the runtime using module-level subprocess (do not re-import here)
+                try:
+                    test_proc = subprocess.run([js_runtime, '--version'], capture_output=True, text=True, timeout=5)
+                    download_result["version_test"] = {
+                        "rc": test_proc.returncode,
+                        "stdout": test_proc.stdout.strip(),
+                        "stderr": test_proc.stderr.strip()
+                    }
+                except Exception as test_err:
+                    download_result["version_test_error"] = str(test_err)
+            else:
+                download_result["error"] = "ensure_deno() returned None"
+        except Exception as dl_err:
+            download_result["error"] = str(dl_err)
+            download_result["traceback"] = traceback.format_exc()
+
+        return {"body": download_result, "statusCode": 200}
+    except Exception as e:
+        _log(f'debug/deno_download error: {e}')
+        return {"body": {"error": str(e)}, "statusCode": 500}
+
+
+# yt-dlp stderr patterns behind a failed extraction, in priority order, each
+# with the reason reported to the client; 'cookies' only qualifies the
+# signature reason. Matched case-insensitively in a single pass.
+_STDERR_PATTERNS = (
+    ('signature', ('signature solving failed', 'n challenge solving')),
+    ('login', ('login_required', 'sign in to confirm')),
+    ('no_js_runtime', ('no supported javascript runtime', 'js runtimes: none')),
+    ('members_only', ('members-only content',)),
+    ('unavailable', ('video unavailable', 'this video is unavailable')),
+    ('cookies', ('found youtube account cookies',)),
+)
+_RE_STDERR = re.compile('|'.join(
+    f"(?P<{name}>{'|'.join(re.escape(p) for p in phrases)})" for name, phrases in _STDERR_PATTERNS
+), re.I)
+_STDERR_REASONS = {
+    'signature': "YouTube signature solving requires a JavaScript runtime (deno/node/bun/quickjs) which is not available on this serverless environment.",
+    'login': "YouTube requires authentication/cookies for this video. This video may be age-restricted or region-locked.",
+    'no_js_runtime': "YouTube extraction requires a JavaScript runtime (deno/node/bun/quickjs) which is not available on this serverless environment.",
+    'members_only': "This video is members-only and requires channel membership.",
+    'unavailable': "Video is unavailable (may be private, deleted, or region-restricted).",
+}
+_STDERR_CATEGORIES = tuple(_STDERR_REASONS)
+_SIGNATURE_WITH_COOKIES_REASON = "Video requires JavaScript runtime for signature solving (cookies loaded successfully but JS runtime unavailable). Try a different video or enable JS runtime support."
+
+
+def _handle_stream(query, path):
+    """/api/stream/{videoId}"""
+    m = _RE_STREAM.fullmatch(path)
+    if not m:
+        return {"body": {"error": "Not found", "path": path}, "statusCode": 404}
+    video_id = m.group(1)
+    if not _RE_VIDEO_ID.fullmatch(video_id):
+        return {"body": {"error": "Invalid video ID"}, "statusCode": 400}
+    _log('api/stream invoked for %s', video_id, lvl=10)
+    try:
+        result = _extract_stream(video_id)
+        if result:
+            return {"body": result, "statusCode": 200}
+        else:
+            # Diagnostic step: attempt a CLI run with verbose output to capture errors
             try:
-                js_runtime = ensure_deno(timeout=45)
-                download_result["path"] = js_runtime
-                download_result["success"] = js_runtime is not None
-                
-                if js_runtime:
-                    # Test the runtime using module-level subprocess (do not re-import here)
-                    try:
-                        test_proc = subprocess.run([js_runtime, '--version'], capture_output=True, text=True, timeout=5)
-                        download_result["version_test"] = {
-                            "rc": test_proc.returncode,
-                            "stdout": test_proc.stdout.strip(),
-                            "stderr": test_proc.stderr.strip()
-                        }
-                    except Exception as test_err:
-                        download_result["version_test_error"] = str(test_err)
+                youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+                diag_cmd = _YTDLP_DIAG_PREFIX + [youtube_url] + _YTDLP_DIAG_ARGS
+                # Check for Deno JS runtime - attempt to get or download
+                deno_path = _deno_path()
+
+                if deno_path:
+                    diag_cmd.extend(['--js-runtimes', f'deno:{deno_path}'])
+                    _log('🦕 Diagnostic using Deno: %s', deno_path, lvl=10)
                 else:
-                    download_result["error"] = "ensure_deno() returned None"
-            except Exception as dl_err:
-                download_result["error"] = str(dl_err)
-                import traceback
-                download_result["traceback"] = traceback.format_exc()
-            
-            return {"body": download_result, "statusCode": 200}
-        except Exception as e:
-            _log(f'debug/deno_download error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
-
-    # API: /api/stream/{videoId}
-    if path and path.startswith('/api/stream/'):
-        video_id = path.split('/')[-1]
-        _log(f'api/stream invoked for {video_id}')
-        try:
-            # Try importing the extractor from the local module
-            extract_youtube_stream = None
-            # Try direct import first
-            try:
-                from serverless_handler_local import extract_youtube_stream as _ext
-                extract_youtube_stream = _ext
-            except Exception:
-                # Fallback: load by file path using importlib
+                    _log('⚠️ No Deno runtime for diagnostic', lvl=10)
+
+                # Add cookies if available - check local package directory first
+                cookies_path, cookies_exist = _cookies_file()
+                if cookies_exist:
+                    diag_cmd.extend(["--cookies", cookies_path])
+                    _log("✅ Diagnostic using cookies: %s", cookies_path, lvl=10)
+                else:
+                    _log("⚠️ No cookies for diagnostic: %s", cookies_path, lvl=10)
+
+                env = _extraction_env()
+
+                _log("Running diagnostic command: %s", diag_cmd, lvl=10)
+                proc = subprocess.run(diag_cmd, capture_output=True, text=True, timeout=_REQUEST_TIMEOUT, env=env)
+                stderr = proc.stderr or ''
+                stdout = proc.stdout or ''
+                _log("Diagnostic rc=%s stderr=%s", proc.returncode, stderr[:300].replace('\n', ' '))
+
+                # Parse stderr for common YouTube protection patterns and provide helpful messages
+                error_msg = "Failed to extract stream"
+                error_reason = None
+                # One scan collects every category present; the first in
+                # _STDERR_CATEGORIES order decides the reason
+                found = {m.lastgroup for m in _RE_STDERR.finditer(stderr)}
+                category = next((c for c in _STDERR_CATEGORIES if c in found), None)
+
+                if category == 'signature' and 'cookies' in found:
+                    # Cookies were found, so only the JS runtime is missing
+                    error_reason = _SIGNATURE_WITH_COOKIES_REASON
+                elif category is not None:
+                    error_reason = _STDERR_REASONS[category]
+                elif proc.returncode != 0 and not stdout.strip():
+                    error_reason = "yt-dlp extraction failed. Check diagnostic stderr for details."
+
+                # Include any Python import error in the diagnostic if present
+                py_import_err = None
                 try:
-                    import importlib.util
-                    base = os.path.dirname(__file__)
-                    cwd = os.getcwd()
-                    candidates = [
-                        os.path.join(base, '..', 'serverless_handler_local.py'),
-                        os.path.join(base, '..', '..', 'serverless_handler_local.py'),
-                        os.path.join(cwd, 'serverless_handler_local.py'),
-                        os.path.join(cwd, 'packages', 'default', 'serverless_handler_local.py'),
-                        os.path.join(cwd, 'packages', 'default', 'serverless_handler', 'serverless_handler_local.py'),
-                        os.path.join(base, 'serverless_handler_local.py')
-                    ]
-                    found = None
-                    for p in candidates:
-                        p_abs = os.path.abspath(p)
-                        if os.path.exists(p_abs):
-                            found = p_abs
-                            break
-                    if not found:
-                        # Fallback: define extractor inline so the function can run even if the
-                        # helper module was not packaged correctly.
-                        _log('serverless_handler_local.py not found; using inline extractor')
-                        def extract_youtube_stream(video_id):
-                            try:
-                                youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-                                import shutil, sys as _sys
-                                binary_candidate = shutil.which(os.environ.get('YT_DLP_PATH', 'yt-dlp'))
-                                if binary_candidate:
-                                    cmd = [
-                                        binary_candidate,
-                                        youtube_url,
-                                        "--no-cache-dir",
-                                        "--no-check-certificate",
-                                        "--dump-single-json",
-                                        "--no-playlist",
-                                        "-f",
-                                        "best[ext=mp4][protocol^=http]/best[protocol^=http]",
-                                    ]
-                                    _log(f"Running (inline binary): {binary_candidate}")
-                                else:
-                                    cmd = [
-                                        _sys.executable, '-m', 'yt_dlp',
-                                        youtube_url,
-                                        "--no-cache-dir",
-                                        "--no-check-certificate",
-                                        "--dump-single-json",
-                                        "--no-playlist",
-                                        "-f",
-                                        "best[ext=mp4][protocol^=http]/best[protocol^=http]",
-                                    ]
-                                    _log(f"Running (inline python -m yt_dlp): {_sys.executable} -m yt_dlp")
-                                
-                                # Check for Deno JS runtime - attempt to get or download
-                                deno_path = None
-                                try:
-                                    # Try importing ensure_deno from serverless_handler_local
-                                    try:
-                                        from serverless_handler_local import ensure_deno
-                                        deno_path = ensure_deno()
-                                    except ImportError:
-                                        # Fallback: check common locations only (no download)
-                                        deno_candidates = [
-                                            os.path.join(os.path.dirname(__file__), 'vendor', 'bin', 'deno'),
-                                            '/tmp/vendor/bin/deno',
-                                            os.path.join(os.getcwd(), 'vendor', 'bin', 'deno'),
-                                            '/tmp/deno/deno'
-                                        ]
-                                        for candidate in deno_candidates:
-                                            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
-                                                deno_path = candidate
-                                                break
-                                        if not deno_path:
-                                            import shutil
-                                            deno_path = shutil.which('deno')
-                                except Exception as de:
-                                    _log(f'Error checking for Deno: {de}')
-
-                                if deno_path:
-                                    cmd.extend(['--js-runtimes', f'deno:{deno_path}'])
-                                    _log(f'🦕 Deno runtime (inline): {deno_path}')
-                                
-                                # Check local package directory first for cookies
-                                _pkg_dir = os.path.dirname(os.path.abspath(__file__))
-                                _local_cookies = os.path.join(_pkg_dir, 'cookies.txt')
-                                if os.path.exists(_local_cookies):
-                                    cookies = _local_cookies
-                                else:
-                                    cookies = os.environ.get('COOKIES_FILE', '/tmp/cookies.txt')
-                                cookies_used = False
-                                if os.path.exists(cookies):
-                                    cmd.extend(["--cookies", cookies])
-                                    cookies_used = True
-                                    _log(f"✅ Using cookies (inline): {cookies}")
-                                else:
-                                    _log(f"⚠️ No cookies file (inline): {cookies}")
-                                _log(f"Running (inline): {' '.join(cmd)}")
-                                if cookies_used:
-                                    _log("🍪 Cookies enabled for this request")
-                                result = subprocess.run(cmd, capture_output=True, text=True, timeout=int(os.environ.get('REQUEST_TIMEOUT', '45')))
-                                if result.returncode != 0:
-                                    _log(f"yt-dlp error (code {result.returncode}): {result.stderr[:200]}")
-                                    return None
-                                data = json.loads(result.stdout)
-                                stream_url = data.get('url')
-                                if not stream_url:
-                                    _log('No URL found in yt-dlp output (inline)')
-                                    return None
-                                return {
-                                    'title': data.get('title', 'Unknown'),
-                                    'url': stream_url,
-                                    'thumbnail': data.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"),
-                                    'duration': str(data.get('duration', 0)),
-                                    'uploader': data.get('uploader', 'Unknown'),
-                                    'id': video_id,
-                                    'videoId': video_id,
-                                    'format_id': data.get('format_id'),
-                                    'ext': data.get('ext', 'mp4')
-                                }
-                            except Exception as e:
-                                _log(f'Inline extraction error: {e}')
-                                return None
-                    else:
-                        spec = importlib.util.spec_from_file_location('sh_local', found)
-                        shl = importlib.util.module_from_spec(spec)
-                        spec.loader.exec_module(shl)
-                        extract_youtube_stream = shl.extract_youtube_stream
+                    import serverless_handler_local as _shl
+                    py_import_err = getattr(_shl, 'PY_IMPORT_ERROR', None)
                 except Exception as e:
-                    _log(f'Import error: {e}')
-                    raise
+                    py_import_err = f'import error reading PY_IMPORT_ERROR: {e}'
+
+                diagnostic = {"rc": proc.returncode, "stderr": stderr[:2000], "stdout_sample": stdout[:2000]}
+                if py_import_err:
+                    diagnostic['python_import_error'] = py_import_err
+
+                body = {"error": error_msg, "diagnostic": diagnostic}
+                if error_reason:
+                    body['reason'] = error_reason
+
+                return {"body": body, "statusCode": 500}
+            except Exception as de:
+                _log(f'Diagnostic run failed: {de}')
+                return {"body": {"error": "Failed to extract stream", "diagnostic_error": str(de)}, "statusCode": 500}
+    except Exception as e:
+        tb = traceback.format_exc()
+        _log('extraction error: %s -- trace: %s', e, tb)
+        return {"body": {"error": str(e), "type": type(e).__name__, "traceback": tb}, "statusCode": 500}
+
+
+def _handle_ytdlp(query, path):
+    """/ytdlp?id={videoId}: direct extraction without diagnostics"""
+    vid = query.get('id')
+    if not vid:
+        return {"body": {"error": "Missing 'id' parameter"}, "statusCode": 400}
+    if not isinstance(vid, str) or not _RE_VIDEO_ID.fullmatch(vid):
+        return {"body": {"error": "Invalid video ID"}, "statusCode": 400}
+    try:
+        result = _extract_stream(vid)
+        if result:
+            return {"body": result, "statusCode": 200}
+        return {"body": {"error": "Failed to extract stream"}, "statusCode": 500}
+    except Exception as e:
+        _log(f'ytdlp error: {e}')
+        return {"body": {"error": str(e)}, "statusCode": 500}
+
+
+# Upper bound on ids per /ytdlp/batch call, so a batch stays inside the
+# function's time limit; the ids are extracted YT_CONCURRENCY at a time (the
+# work is network-bound, so threads overlap despite the GIL)
+_BATCH_MAX_IDS = 10
+_BATCH_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get('YT_CONCURRENCY', '4')),
+                                 thread_name_prefix='ytdlp-batch')
+
+
+def _handle_ytdlp_batch(query, path):
+    """/ytdlp/batch?ids={id},{id},...: several extractions in one invocation
+
+    The ids run concurrently on the warm extractor (each pool thread keeps its
+    own YoutubeDL and connections; the stream cache is shared); results keep
+    the order of the request.
+    """
+    ids = query.get('ids')
+    if not ids or not isinstance(ids, str):
+        return {"body": {"error": "Missing 'ids' parameter"}, "statusCode": 400}
+    ids = [v.strip() for v in ids.split(',') if v.strip()]
+    if len(ids) > _BATCH_MAX_IDS:
+        return {"body": {"error": f"At most {_BATCH_MAX_IDS} ids per batch"}, "statusCode": 400}
+    invalid = [v for v in ids if not _RE_VIDEO_ID.fullmatch(v)]
+    if invalid:
+        return {"body": {"error": "Invalid video ID", "ids": invalid}, "statusCode": 400}
+    _log('ytdlp/batch invoked for %s ids', len(ids), lvl=10)
+    # Resolve the extractor here so the pool threads don't all queue on the lock
+    _get_extractor()
+    results = list(_BATCH_POOL.map(_batch_item, ids))
+    return {"body": {"results": results}, "statusCode": 200}
+
+
+def _batch_item(vid):
+    """One /ytdlp/batch result: the stream info, or an error entry for vid"""
+    try:
+        result = _extract_stream(vid)
+    except Exception as e:
+        _log(f'ytdlp/batch error for {vid}: {e}')
+        result = None
+    return result or {"id": vid, "videoId": vid, "error": "Failed to extract stream"}
+
+
+def _handle_search(q, path):
+    """/api/search/youtube?query=&limit="""
+    query = q.get('query') or q.get('q')
+    try:
+        limit = int(q.get('limit', 5)) if isinstance(q.get('limit', None), (str, int)) else 5
+    except Exception:
+        limit = 5
+    if not query:
+        return {"body": {"error": "Missing 'query' parameter"}, "statusCode": 400}
+    _log('api/search/youtube invoked for query="%s" limit=%s', query, limit, lvl=10)
+    try:
+        results = _search_results(query, limit)
+        return {"body": {"query": query, "limit": limit, "results": results}, "statusCode": 200}
+    except Exception as e:
+        _log(f'search error: {e}')
+        return {"body": {"error": str(e)}, "statusCode": 500}
+
+
+# Exact paths are a dict lookup; the remaining routes match by substring (so
+# they also work under a function prefix such as /default/serverless_handler)
+# or by prefix, checked in order
+_EXACT = {
+    '/health': _handle_health,
+    '/hello': _handle_hello,
+    '/playground': _handle_playground,
+    '/ytdlp': _handle_ytdlp,
+    '/ytdlp/batch': _handle_ytdlp_batch,
+}
+# Debug endpoints, keyed by the path segment after /debug/
+_DEBUG = {
+    'sys': _handle_debug_sys,
+    'py': _handle_debug_py,
+    'ytdlp_version': _handle_debug_ytdlp_version,
+    'cookies': _handle_debug_cookies,
+    'deno': _handle_debug_deno,
+    'deno_download': _handle_debug_deno_download,
+}
+
+
+def _handle_debug(query, path):
+    """*/debug/{name}: dispatch to the matching debug endpoint"""
+    name = path[path.find('/debug/') + len('/debug/'):].partition('/')[0]
+    handler = _DEBUG.get(name)
+    if handler is None:
+        _log(f'unknown path: {path}')
+        return {"body": {"error": "Not found", "path": path}, "statusCode": 404}
+    return handler(query, path)
+
+
+_CONTAINS = (
+    ('/static/', _handle_static),
+    ('/debug/', _handle_debug),
+)
+_PREFIX = (
+    ('/api/stream/', _handle_stream),
+    ('/api/search/youtube', _handle_search),
+)
+
+
+def main(event=None, context=None):
+    """Entry point for DigitalOcean Functions (event, context)
+
+    Handles a few simple paths for validation:
+      - /health -> returns status
+      - /hello -> returns a small JSON message
+    """
+    _LOG_RING.clear()
+    try:
+        response = _route(event)
+        if response.get('statusCode', 200) >= 500:
+            _emit_log_ring()
+        return response
+    except Exception:
+        _emit_log_ring()
+        raise
+    finally:
+        _flush_log()
+
+
+def _route(event):
+    """Dispatch one invocation to its handler"""
+    _log('main invoked', lvl=10)
+    # event may be None for non-http calls; read http/query once and hand
+    # handlers the query dict directly
+    if not (event and isinstance(event, dict)):
+        event = {}
+    http = event.get('http') or {}
+    path = http.get('path')
+    query = event.get('query') or {}
+    if not isinstance(query, dict):
+        query = {}
+
+    # Default behavior: health
+    if not path:
+        return _handle_health(query, path)
+
+    handler = _EXACT.get(path)
+    if handler is not None:
+        return handler(query, path)
+    for fragment, handler in _CONTAINS:
+        if fragment in path:
+            return handler(query, path)
+    for prefix, handler in _PREFIX:
+        if path.startswith(prefix):
+            return handler(query, path)
 
-            result = extract_youtube_stream(video_id)
-            if result:
-                return {"body": result, "statusCode": 200}
-            else:
-                # Diagnostic step: attempt a CLI run with verbose output to capture errors
-                try:
-                    youtube_url = f"https://www.youtube.com/watch?v={video_id}"
-                    import shutil, sys as _sys
-                    # Prefer a found binary (from YT_DLP_PATH or PATH); otherwise use `python -m yt_dlp`
-                    binary_candidate = shutil.which(os.environ.get('YT_DLP_PATH', 'yt-dlp'))
-                    if binary_candidate:
-                        diag_cmd = [
-                            binary_candidate,
-                            youtube_url,
-                            "--no-cache-dir",
-                            "--no-check-certificate",
-                            "--dump-single-json",
-                            "--no-playlist",
-                            "-f",
-                            "best[ext=mp4]/best",
-                            "-v"
-                        ]
-                        _log(f"Running diagnostic command (binary): {' '.join(diag_cmd)}")
-                    else:
-                        diag_cmd = [
-                            _sys.executable, '-m', 'yt_dlp',
-                            youtube_url,
-                            "--no-cache-dir",
-                            "--no-check-certificate",
-                            "--dump-single-json",
-                            "--no-playlist",
-                            "-f",
-                            "best[ext=mp4]/best",
-                            "-v"
-                        ]
-                        _log(f"Running diagnostic command (python -m yt_dlp): {_sys.executable} -m yt_dlp")
-                    
-                    # Check for Deno JS runtime - attempt to get or download
-                    deno_path = None
-                    try:
-                        # Try importing ensure_deno from serverless_handler_local
-                        try:
-                            from serverless_handler_local import ensure_deno
-                            deno_path = ensure_deno()
-                        except ImportError:
-                            # Fallback: check common locations only (no download)
-                            deno_candidates = [
-                                os.path.join(os.path.dirname(__file__), 'vendor', 'bin', 'deno'),
-                                '/tmp/vendor/bin/deno',
-                                os.path.join(os.getcwd(), 'vendor', 'bin', 'deno'),
-                                '/tmp/deno/deno'
-                            ]
-                            for candidate in deno_candidates:
-                                if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
-                                    deno_path = candidate
-                                    break
-                            if not deno_path:
-                                import shutil
-                                deno_path = shutil.which('deno')
-                    except Exception as de:
-                        _log(f'Error checking for Deno: {de}')
-
-                    if deno_path:
-                        diag_cmd.extend(['--js-runtimes', f'deno:{deno_path}'])
-                        _log(f'🦕 Diagnostic using Deno: {deno_path}')
-                    else:
-                        _log('⚠️ No Deno runtime for diagnostic')
-                    
-                    # Add cookies if available - check local package directory first
-                    _pkg_dir = os.path.dirname(os.path.abspath(__file__))
-                    _local_cookies = os.path.join(_pkg_dir, 'cookies.txt')
-                    if os.path.exists(_local_cookies):
-                        cookies_path = _local_cookies
-                    else:
-                        cookies_path = os.environ.get('COOKIES_FILE', '/tmp/cookies.txt')
-                    if os.path.exists(cookies_path):
-                        diag_cmd.extend(["--cookies", cookies_path])
-                        _log(f"✅ Diagnostic using cookies: {cookies_path}")
-                    else:
-                        _log(f"⚠️ No cookies for diagnostic: {cookies_path}")
-                    
-                    env = os.environ.copy()
-                    existing_pp = env.get('PYTHONPATH', '')
-                    vendor_paths = []
-                    for p in ['/tmp/vendor', '/tmp/vendor/lib/python3.11/site-packages', '/tmp/.local/lib/python3.11/site-packages']:
-                        try:
-                            if os.path.isdir(p):
-                                vendor_paths.append(p)
-                        except Exception:
-                            continue
-                    new_pp = os.pathsep.join(vendor_paths) if vendor_paths else ''
-                    if new_pp and existing_pp:
-                        env['PYTHONPATH'] = new_pp + os.pathsep + existing_pp
-                    elif new_pp:
-                        env['PYTHONPATH'] = new_pp
-                    else:
-                        env['PYTHONPATH'] = existing_pp
-
-                    proc = subprocess.run(diag_cmd, capture_output=True, text=True, timeout=int(os.environ.get('REQUEST_TIMEOUT', '45')), env=env)
-                    stderr = proc.stderr or ''
-                    stdout = proc.stdout or ''
-                    _log(f"Diagnostic rc={proc.returncode} stderr={(stderr[:300]).replace(chr(10),' ')}")
-                    
-                    # Parse stderr for common YouTube protection patterns and provide helpful messages
-                    error_msg = "Failed to extract stream"
-                    error_reason = None
-                    stderr_lower = stderr.lower()
-                    
-                    # Check if cookies were found to provide more context
-                    cookies_found = 'found youtube account cookies' in stderr_lower
-                    
-                    if 'signature solving failed' in stderr_lower or 'n challenge solving' in stderr_lower:
-                        if cookies_found:
-                            error_reason = "Video requires JavaScript runtime for signature solving (cookies loaded successfully but JS runtime unavailable). Try a different video or enable JS runtime support."
-                        else:
-                            error_reason = "YouTube signature solving requires a JavaScript runtime (deno/node/bun/quickjs) which is not available on this serverless environment."
-                    elif 'login_required' in stderr_lower or 'sign in to confirm' in stderr_lower:
-                        error_reason = "YouTube requires authentication/cookies for this video. This video may be age-restricted or region-locked."
-                    elif 'no supported javascript runtime' in stderr_lower or 'js runtimes: none' in stderr_lower:
-                        error_reason = "YouTube extraction requires a JavaScript runtime (deno/node/bun/quickjs) which is not available on this serverless environment."
-                    elif 'members-only content' in stderr_lower:
-                        error_reason = "This video is members-only and requires channel membership."
-                    elif 'video unavailable' in stderr_lower or 'this video is unavailable' in stderr_lower:
-                        error_reason = "Video is unavailable (may be private, deleted, or region-restricted)."
-                    elif proc.returncode != 0 and not stdout.strip():
-                        error_reason = "yt-dlp extraction failed. Check diagnostic stderr for details."
-                    
-                    # Include any Python import error in the diagnostic if present
-                    py_import_err = None
-                    try:
-                        import serverless_handler_local as _shl
-                        py_import_err = getattr(_shl, 'PY_IMPORT_ERROR', None)
-                    except Exception as e:
-                        py_import_err = f'import error reading PY_IMPORT_ERROR: {e}'
-                    
-                    diagnostic = {"rc": proc.returncode, "stderr": stderr[:2000], "stdout_sample": stdout[:2000]}
-                    if py_import_err:
-                        diagnostic['python_import_error'] = py_import_err
-                    
-                    body = {"error": error_msg, "diagnostic": diagnostic}
-                    if error_reason:
-                        body['reason'] = error_reason
-                    
-                    return {"body": body, "statusCode": 500}
-                except Exception as de:
-                    _log(f'Diagnostic run failed: {de}')
-                    return {"body": {"error": "Failed to extract stream", "diagnostic_error": str(de)}, "statusCode": 500}
-        except Exception as e:
-            import traceback
-            tb = traceback.format_exc()
-            _log(f'extraction error: {e} -- trace: {tb}')
-            return {"body": {"error": str(e), "type": type(e).__name__, "traceback": tb}, "statusCode": 500}
-
-    # Direct ytdlp endpoint: /ytdlp?id={videoId}
-    if path == '/ytdlp':
-        q = event.get('query', {}) if event else {}
-        vid = q.get('id') if isinstance(q, dict) else None
-        if not vid:
-            return {"body": {"error": "Missing 'id' parameter"}, "statusCode": 400}
-        try:
-            from serverless_handler_local import extract_youtube_stream
-            result = extract_youtube_stream(vid)
-            if result:
-                return {"body": result, "statusCode": 200}
-            return {"body": {"error": "Failed to extract stream"}, "statusCode": 500}
-        except Exception as e:
-            _log(f'ytdlp error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
-    # API: /api/search/youtube
-    if path and path.startswith('/api/search/youtube'):
-        q = event.get('query', {}) if event else {}
-        query = (q.get('query') or q.get('q')) if isinstance(q, dict) else None
-        try:
-            limit = int(q.get('limit', 5)) if isinstance(q.get('limit', None), (str, int)) else 5
-        except Exception:
-            limit = 5
-        if not query:
-            return {"body": {"error": "Missing 'query' parameter"}, "statusCode": 400}
-        _log(f'api/search/youtube invoked for query="{query}" limit={limit}')
-        try:
-            # Prefer helper from serverless_handler_local if available
-            try:
-                from serverless_handler_local import search_youtube as _search
-            except Exception:
-                _log('serverless_handler_local.search_youtube not available; using inline search')
-                def _search(query, limit=5):
-                    try:
-                        import yt_dlp
-                        ydl_opts = {'quiet': True, 'skip_download': True, 'nocheckcertificate': True}
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            data = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
-                        entries = data.get('entries', []) if isinstance(data, dict) else []
-                        results = []
-                        for e in entries:
-                            results.append({
-                                'id': e.get('id'),
-                                'title': e.get('title'),
-                                'duration': str(e.get('duration', 0)) if e.get('duration') is not None else '0',
-                                'url': f"https://www.youtube.com/watch?v={e.get('id')}",
-                                'thumbnail': e.get('thumbnail')
-                            })
-                        return results
-                    except Exception as e:
-                        _log(f'Inline search error: {e}')
-                        return []
-            results = _search(query, limit)
-            return {"body": {"query": query, "limit": limit, "results": results}, "statusCode": 200}
-        except Exception as e:
-            _log(f'search error: {e}')
-            return {"body": {"error": str(e)}, "statusCode": 500}
     # Unknown path
     _log(f'unknown path: {path}')
     return {"body": {"error": "Not found", "path": path}, "statusCode": 404}
+
+
+# Overlap the cold-start imports with platform start-up instead of paying them
+# on the first request's critical path (requests arriving early wait on the lock)
+if os.environ.get('WARM_ON_IMPORT', '1') == '1':
+    threading.Thread(target=_warm, name='warm-up', daemon=True).start()
@@ -13,6 +13,12 @@ else
     echo "⚠️  Node.js not available"
 fi
 
+# The yt-dlp worker pool is maintained once in packages/default/; ship a copy with the function
+if [ -f ../ytdlp_pool.py ]; then
+    cp ../ytdlp_pool.py ./ytdlp_pool.py
+    echo "✅ Copied ytdlp_pool.py"
+fi
+
 # Install Python requirements
 PY="$(which python || which python3 || echo python)"
 $PY -m pip install --upgrade pip
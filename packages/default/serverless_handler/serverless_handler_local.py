@@ -1,7 +1,69 @@
+import importlib.util
 import json
 import subprocess
 import os
-from datetime import datetime
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+def _import_ytdlp_pool():
+    """Import ytdlp_pool, whose one copy lives in packages/default/
+
+    build.sh copies it next to this file for deploys; an unbuilt checkout
+    loads it from the parent directory by path instead.
+    """
+    try:
+        import ytdlp_pool
+        return ytdlp_pool
+    except ImportError:
+        pass
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ytdlp_pool.py')
+    if not os.path.exists(path):
+        raise ImportError('ytdlp_pool not found')
+    spec = importlib.util.spec_from_file_location('ytdlp_pool', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    sys.modules['ytdlp_pool'] = module
+    return module
+
+
+try:
+    _ytdlp_pool = _import_ytdlp_pool()
+    WorkerPool = _ytdlp_pool.WorkerPool
+    WorkerError = _ytdlp_pool.WorkerError
+    WorkerTimeout = _ytdlp_pool.WorkerTimeout
+    ExtractError = _ytdlp_pool.ExtractError
+except ImportError:
+    WorkerPool = None
+
+    # Stand-ins so the except clauses around run_ytdlp_pooled() stay valid
+    class WorkerError(Exception):
+        pass
+
+    class WorkerTimeout(WorkerError):
+        pass
+
+    class ExtractError(Exception):
+        pass
+
+# yt_dlp in-process is the primary extraction path; the import error (if any)
+# is kept for the handler's /api/stream diagnostic
+try:
+    import yt_dlp
+    PY_IMPORT_ERROR = None
+except ImportError as e:
+    yt_dlp = None
+    PY_IMPORT_ERROR = str(e)
+
+# orjson when available (much faster on large yt-dlp JSON); stdlib json otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
 
 # Version marker for deployment verification
 __VERSION__ = "2026.02.17.001"
@@ -18,20 +80,32 @@ YT_DLP_PATH = os.environ.get('YT_DLP_PATH', 'yt-dlp')
 LOG_DIR = os.environ.get('LOG_DIR', '/tmp/proxyLogs')
 REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', '45'))
 
-os.makedirs(LOG_DIR, exist_ok=True)
+
+# (epoch second, formatted) of the last log timestamp; strftime runs at most
+# once per second however many lines are logged
+_ts_cache = (None, '')
+
+
+def _timestamp():
+    """Current UTC time as 'YYYY-MM-DD HH:MM:SS'"""
+    global _ts_cache
+    sec = int(time.time())
+    if sec != _ts_cache[0]:
+        _ts_cache = (sec, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(sec)))
+    return _ts_cache[1]
 
 
 def _log(msg):
-    ts = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-    line = f"[{ts}] {msg}"
+    # No per-line flush: the handler's main() flushes stdout once per invocation
+    line = f"[{_timestamp()}] {msg}"
     try:
-        print(line, flush=True)
+        print(line)
     except Exception:
         pass
 
 # Note: we rely on yt-dlp being installed via requirements.txt at build time.
-# Do not vendor or prepend local vendor dirs; prefer subprocess binary (yt-dlp)
-# and fall back to `python -m yt_dlp` when necessary.
+# Do not vendor or prepend local vendor dirs; the `yt-dlp` binary is only the
+# fallback when yt_dlp can't be imported in-process.
 
 
 
@@ -41,6 +115,40 @@ import shutil
 
 # yt-dlp will be available via pip install in requirements.txt
 
+# Node.js (yt-dlp's JS runtime for signature solving) is looked up once, and
+# the invariant part of the one-shot yt-dlp command is built once
+NODE_PATH = shutil.which('node')
+YT_DLP_CMD_ARGS = [
+    "--no-cache-dir",
+    "--no-check-certificate",
+    "--no-playlist",
+    "-f", "best[ext=mp4][protocol^=http]/best[protocol^=http]"
+]
+if NODE_PATH:
+    YT_DLP_CMD_ARGS.extend(['--js-runtimes', f'node:{NODE_PATH}'])
+
+# The subprocess prints (-O) only the fields _stream_result reads rather than the
+# whole --dump-single-json document: one JSON array of %(field)j values, so tabs,
+# newlines or a literal "NA" in a title come through escaped, and missing fields
+# print as null. The JSON dump is only the fallback for output that doesn't parse
+YT_DLP_PRINT_FIELDS = ('url', 'format_id', 'ext', 'duration', 'thumbnail', 'uploader', 'title')
+YT_DLP_PRINT_ARGS = ['--output-na-placeholder', 'null',
+                     '-O', '[' + ','.join(f'%({field})j' for field in YT_DLP_PRINT_FIELDS) + ']']
+
+# Whether COOKIES_FILE exists is re-stat'ed at most this often rather than on
+# every extraction (cookies may still be dropped into /tmp after start-up)
+COOKIES_RECHECK_INTERVAL = 30
+_cookies_state = {'checked_at': None, 'exists': False}
+
+
+def cookies_exist():
+    """Cached os.path.exists(COOKIES_FILE), refreshed every COOKIES_RECHECK_INTERVAL seconds"""
+    now = time.monotonic()
+    if _cookies_state['checked_at'] is None or now - _cookies_state['checked_at'] >= COOKIES_RECHECK_INTERVAL:
+        _cookies_state['exists'] = os.path.exists(COOKIES_FILE)
+        _cookies_state['checked_at'] = now
+    return _cookies_state['exists']
+
 
 
 
@@ -54,19 +162,16 @@ def extract_youtube_stream_nodejs(video_id):
     Returns dict with stream info or None on failure.
     """
     try:
-        import shutil as _shutil
-        import sys as _sys
-
-        # Find Node.js executable
-        node_path = _shutil.which('node')
+        # Node.js executable (looked up once at import)
+        node_path = NODE_PATH
         if not node_path:
             _log('⚠️  Node.js not found in PATH')
             return None
 
         # Find the extract_youtube_nodejs.js script
         script_candidates = [
-            os.path.join(os.path.dirname(__file__), 'extract_youtube_nodejs.js'),
-            os.path.join(os.path.dirname(__file__), '..', '..', 'extract_youtube_nodejs.js'),
+            os.path.join(_PACKAGE_DIR, 'extract_youtube_nodejs.js'),
+            os.path.join(_PACKAGE_DIR, '..', '..', 'extract_youtube_nodejs.js'),
             os.path.join(os.getcwd(), 'extract_youtube_nodejs.js'),
         ]
 
@@ -86,17 +191,18 @@ def extract_youtube_stream_nodejs(video_id):
         cmd = [node_path, script_path, video_id]
 
         # Add cookies if available
-        if os.path.exists(COOKIES_FILE):
+        if cookies_exist():
             cmd.append(COOKIES_FILE)
             _log(f'🍪 Node.js using cookies: {COOKIES_FILE}')
 
         try:
             _log(f'Running Node.js extraction...')
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            # stdout stays bytes: _json_loads parses it without a str decode
+            result = subprocess.run(cmd, capture_output=True, timeout=30)
 
             if result.returncode == 0:
                 try:
-                    data = json.loads(result.stdout)
+                    data = _json_loads(result.stdout)
                     if 'error' in data:
                         _log(f'Node.js error: {data.get("reason", data.get("error"))}')
                         return None
@@ -120,7 +226,7 @@ def extract_youtube_stream_nodejs(video_id):
                     _log(f'Node.js JSON error: {je}')
                     return None
             else:
-                stderr = (result.stderr or '')[:200]
+                stderr = (result.stderr or b'')[:200].decode('utf-8', 'replace')
                 _log(f'Node.js failed (rc={result.returncode}): {stderr}')
                 return None
 
@@ -136,60 +242,224 @@ def extract_youtube_stream_nodejs(video_id):
         return None
 
 
+# In-process YoutubeDL instances, one per distinct option set and thread (an
+# instance isn't safe to share between concurrent extractions), kept for the
+# container's lifetime (not closed per call) so warm requests reuse the
+# extractor registry and the HTTP connections
+_YDLS = threading.local()
+SEARCH_YDL_OPTS = {'quiet': True, 'skip_download': True, 'nocheckcertificate': True}
+
+
+def _get_ydl(opts):
+    """Return this thread's yt_dlp.YoutubeDL for these options, creating it on first use"""
+    key = json.dumps(opts, sort_keys=True)
+    ydls = getattr(_YDLS, 'by_opts', None)
+    if ydls is None:
+        ydls = _YDLS.by_opts = {}
+    ydl = ydls.get(key)
+    if ydl is None:
+        # YoutubeDL adds its defaults to the dict it is given; keep opts intact
+        ydl = ydls[key] = yt_dlp.YoutubeDL(dict(opts))
+    return ydl
+
+
+# Extraction runs yt_dlp in-process on a shared YoutubeDL. Setting
+# YTDLP_POOL_SIZE moves it into long-lived worker processes instead (a job
+# that overruns REQUEST_TIMEOUT is then killed); the one-shot `yt-dlp`
+# subprocess is only used when neither is available
+USE_WORKER_POOL = bool(os.environ.get('YTDLP_POOL_SIZE'))
+YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'nocheckcertificate': True,
+    'noplaylist': True,
+    'cachedir': False,
+    'format': 'best[ext=mp4][protocol^=http]/best[protocol^=http]'
+}
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+# Set once a worker has replied; a WorkerError before that means the workers
+# can't start (e.g. yt_dlp not importable) and the pool is switched off
+_worker_pool_proven = False
+
+
+def get_worker_pool():
+    """Return the shared yt-dlp worker pool, or None if it cannot be started"""
+    global _worker_pool, WorkerPool
+    if _worker_pool is None and WorkerPool is not None:
+        with _worker_pool_lock:
+            if _worker_pool is None:
+                try:
+                    # One invocation at a time per container, so a single worker by default
+                    _worker_pool = WorkerPool(int(os.environ.get('YTDLP_POOL_SIZE', '1')))
+                except OSError as e:
+                    _log(f'⚠️ yt-dlp worker pool unavailable: {e}')
+                    WorkerPool = None
+    return _worker_pool
+
+
+def _extract_opts():
+    """YDL_OPTS plus the Node.js runtime and the cookies file, when present"""
+    opts = dict(YDL_OPTS)
+    if NODE_PATH:
+        opts['js_runtimes'] = {'node': {'path': NODE_PATH}}
+    if cookies_exist():
+        opts['cookiefile'] = COOKIES_FILE
+    return opts
+
+
+def _disable_worker_pool(reason):
+    """Stop using the worker pool for the rest of the container's lifetime"""
+    global _worker_pool, WorkerPool
+    with _worker_pool_lock:
+        pool, _worker_pool, WorkerPool = _worker_pool, None, None
+    if pool is not None:
+        pool.close()
+    _log(f'⚠️ yt-dlp worker pool disabled, using the subprocess from now on: {reason}')
+
+
+def run_ytdlp_pooled(youtube_url):
+    """Extract info through the worker; None means fall back to the subprocess"""
+    global _worker_pool_proven
+    pool = get_worker_pool()
+    if pool is None:
+        return None
+    try:
+        info = pool.extract_info(youtube_url, _extract_opts(), REQUEST_TIMEOUT)
+    except ExtractError:
+        _worker_pool_proven = True
+        raise
+    except WorkerTimeout:
+        raise
+    except WorkerError as e:
+        # A worker that dies before ever replying would otherwise be respawned
+        # (and die again) on every request
+        if not _worker_pool_proven:
+            _disable_worker_pool(e)
+        raise
+    _worker_pool_proven = True
+    return info
+
+
+# In-process extractions run on these threads so the caller can stop waiting
+# after REQUEST_TIMEOUT (socket_timeout alone doesn't bound the whole extraction,
+# which makes many requests); a timed-out call finishes in the background
+_INPROCESS_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get('YT_CONCURRENCY', '4')),
+                                     thread_name_prefix='ytdlp')
+
+
+def _extract_inprocess(youtube_url, opts):
+    return _get_ydl(opts).extract_info(youtube_url, download=False)
+
+
+def run_ytdlp_inprocess(youtube_url):
+    """Extract info with the shared in-process YoutubeDL; None if yt_dlp isn't importable
+
+    Raises concurrent.futures.TimeoutError past REQUEST_TIMEOUT.
+    """
+    if yt_dlp is None:
+        return None
+    opts = _extract_opts()
+    opts['socket_timeout'] = REQUEST_TIMEOUT
+    return _INPROCESS_POOL.submit(_extract_inprocess, youtube_url, opts).result(REQUEST_TIMEOUT)
+
+
+def _parse_printed(stdout):
+    """Fields printed by YT_DLP_PRINT_ARGS as a dict (missing ones left out), or None"""
+    try:
+        values = _json_loads(stdout)
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(YT_DLP_PRINT_FIELDS):
+        return None
+    return {field: value for field, value in zip(YT_DLP_PRINT_FIELDS, values) if value is not None}
+
+
+def _stream_result(video_id, data):
+    """Build the API response from yt-dlp info, or None if it has no stream URL"""
+    stream_url = data.get('url')
+    
+    if not stream_url:
+        _log(f'No URL in yt-dlp output for {video_id}')
+        return None
+    
+    _log(f'✅ Extracted {video_id}')
+    return {
+        'title': data.get('title', 'Unknown'),
+        'url': stream_url,
+        'thumbnail': data.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"),
+        'duration': str(data.get('duration', 0)),
+        'uploader': data.get('uploader', 'Unknown'),
+        'id': video_id,
+        'videoId': video_id,
+        'format_id': data.get('format_id'),
+        'ext': data.get('ext', 'mp4')
+    }
+
+
 def extract_youtube_stream(video_id):
     """Extract YouTube stream using yt-dlp (simple proven logic)."""
     try:
         youtube_url = f"https://www.youtube.com/watch?v={video_id}"
         
+        if USE_WORKER_POOL:
+            try:
+                data = run_ytdlp_pooled(youtube_url)
+            except (WorkerTimeout, ExtractError) as e:
+                _log(f'yt-dlp error: {str(e)[:200]}')
+                return None
+            except WorkerError as e:
+                # Worker could not run (e.g. yt_dlp not importable); use the binary
+                _log(f'⚠️ yt-dlp worker failed, falling back to subprocess: {e}')
+                data = None
+        else:
+            try:
+                data = run_ytdlp_inprocess(youtube_url)
+            except yt_dlp.utils.DownloadError as e:
+                # No subprocess retry: the binary runs the same extractor with
+                # the same cookies and JS runtime, so it fails the same way
+                # (unavailable, private, bot check) after another full attempt
+                _log(f'yt-dlp error: {str(e)[:200]}')
+                return None
+            except FutureTimeout:
+                # The subprocess would need another REQUEST_TIMEOUT, past the
+                # function's own limit
+                _log(f'Timeout extracting {video_id}')
+                return None
+        if data is not None:
+            return _stream_result(video_id, data)
+        
         # Build yt-dlp command
-        cmd = [
-            'yt-dlp',
-            youtube_url,
-            "--no-cache-dir",
-            "--no-check-certificate",
-            "--dump-single-json",
-            "--no-playlist",
-            "-f", "best[ext=mp4][protocol^=http]/best[protocol^=http]"
-        ]
+        cmd = ['yt-dlp', youtube_url] + YT_DLP_CMD_ARGS
         
-        # Add Node.js as JS runtime if available
-        node_path = shutil.which('node')
-        if node_path:
-            cmd.extend(['--js-runtimes', f'node:{node_path}'])
-            _log(f'Using Node.js JS runtime: {node_path}')
+        # Node.js is passed as JS runtime when available
+        if NODE_PATH:
+            _log(f'Using Node.js JS runtime: {NODE_PATH}')
         else:
             _log('⚠️  Node.js not available - signature solving may fail')
         
         # Add cookies if file exists
-        if os.path.exists(COOKIES_FILE):
+        if cookies_exist():
             cmd.extend(["--cookies", COOKIES_FILE])
         
         _log(f'Extracting {video_id}...')
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=REQUEST_TIMEOUT)
+        result = subprocess.run(cmd + YT_DLP_PRINT_ARGS, capture_output=True, timeout=REQUEST_TIMEOUT)
         
         if result.returncode != 0:
-            _log(f'yt-dlp error (rc={result.returncode}): {result.stderr[:200]}')
-            return None
-        
-        data = json.loads(result.stdout)
-        stream_url = data.get('url')
-        
-        if not stream_url:
-            _log(f'No URL in yt-dlp output for {video_id}')
+            _log(f"yt-dlp error (rc={result.returncode}): {result.stderr[:200].decode('utf-8', 'replace')}")
             return None
         
-        _log(f'✅ Extracted {video_id}')
-        return {
-            'title': data.get('title', 'Unknown'),
-            'url': stream_url,
-            'thumbnail': data.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"),
-            'duration': str(data.get('duration', 0)),
-            'uploader': data.get('uploader', 'Unknown'),
-            'id': video_id,
-            'videoId': video_id,
-            'format_id': data.get('format_id'),
-            'ext': data.get('ext', 'mp4')
-        }
+        data = _parse_printed(result.stdout)
+        if data is None:
+            _log('Unexpected yt-dlp -O output; retrying with --dump-single-json')
+            # stdout stays bytes: _json_loads parses it without a str decode
+            result = subprocess.run(cmd + ['--dump-single-json'], capture_output=True, timeout=REQUEST_TIMEOUT)
+            if result.returncode != 0:
+                _log(f"yt-dlp error (rc={result.returncode}): {result.stderr[:200].decode('utf-8', 'replace')}")
+                return None
+            data = _json_loads(result.stdout)
+        return _stream_result(video_id, data)
     except subprocess.TimeoutExpired:
         _log(f'Timeout extracting {video_id}')
         return None
@@ -201,10 +471,7 @@ def extract_youtube_stream(video_id):
 def search_youtube(query, limit=5):
     """Search YouTube using yt_dlp's ytsearch and return simple result objects."""
     try:
-        import yt_dlp
-        ydl_opts = {'quiet': True, 'skip_download': True, 'nocheckcertificate': True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            data = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
+        data = _get_ydl(SEARCH_YDL_OPTS).extract_info(f"ytsearch{limit}:{query}", download=False)
         entries = data.get('entries', []) if isinstance(data, dict) else []
         results = []
         for e in entries:
@@ -4,21 +4,108 @@ Wrapper for YouTube Stream URL extraction and proxying
 """
 
 import json
+import re
+import hashlib
 import subprocess
 import os
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs, quote
 from flask import Flask, request, jsonify, Response
+from flask.json.provider import DefaultJSONProvider
 import requests
+import threading
+import time
+import queue
+import atexit
+from collections import OrderedDict
+
+try:
+    from ytdlp_pool import WorkerPool, WorkerError, WorkerTimeout, ExtractError
+except ImportError:
+    WorkerPool = None
+
+    # Stand-ins so the except clauses around run_ytdlp_pooled() stay valid
+    class WorkerError(Exception):
+        pass
+
+    class WorkerTimeout(WorkerError):
+        pass
+
+    class ExtractError(Exception):
+        pass
+
+# orjson when available (much faster on large yt-dlp JSON); stdlib json otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
 
 app = Flask(__name__)
 
+# orjson-backed jsonify() for when this file runs as the local Flask server; the
+# DO function only imports its extraction helpers and never touches the app
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+    
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# YouTube video IDs are exactly 11 characters of [A-Za-z0-9_-]; anything else
+# is rejected before it can reach yt-dlp
+VIDEO_ID_RE = re.compile(r'[A-Za-z0-9_-]{11}')
+
+def valid_video_id(video_id):
+    return video_id is not None and VIDEO_ID_RE.fullmatch(video_id) is not None
+
+# Error replies for the local server's routes, encoded once when the module loads
+def _error_body(message):
+    return json.dumps({"error": message}, separators=(',', ':')).encode() + b'\n'
+
+def json_error(body, status):
+    """Return a pre-serialized JSON error body"""
+    return Response(body, status=status, mimetype='application/json')
+
+ERR_EXTRACT_FAILED = _error_body("Failed to extract stream")
+ERR_EXTRACT_URL_FAILED = _error_body("Failed to extract stream URL")
+ERR_MISSING_ID = _error_body("Missing 'id' parameter")
+ERR_INVALID_ID = _error_body("Invalid video ID")
+ERR_MISSING_URL = _error_body("Missing 'url' parameter")
+ERR_NOT_FOUND = _error_body("Endpoint not found")
+ERR_INTERNAL = _error_body("Internal server error")
+
 # Configuration
 COOKIES_FILE = os.environ.get('COOKIES_FILE', '/tmp/cookies.txt')
 YT_DLP_PATH = os.environ.get('YT_DLP_PATH', 'yt-dlp')
 LOG_DIR = os.environ.get('LOG_DIR', '/tmp/proxyLogs')
 REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', '45'))
 
+# Invariant part of the yt-dlp command, built once (URL/cookies appended per call)
+YT_DLP_CMD_PREFIX = [
+    YT_DLP_PATH,
+    "--no-cache-dir",
+    "--no-check-certificate",
+    "--dump-single-json",
+    "--no-playlist",
+    "-f", "best[ext=mp4][protocol^=http]/best[protocol^=http]"
+]
+
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # Startup instrumentation: print environment to help debug serverless initialization
@@ -37,24 +124,159 @@ except Exception as _e:
 # Store recent yt-dlp execution logs (last 10)
 ytdlp_logs = []
 
+# Long-lived yt-dlp workers (created on first extraction); the one-shot
+# YT_DLP_PATH subprocess is only used when the pool is unavailable
+YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'nocheckcertificate': True,
+    'noplaylist': True,
+    'cachedir': False,
+    'format': 'best[ext=mp4][protocol^=http]/best[protocol^=http]'
+}
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+# Set once a worker has replied; a WorkerError before that means the workers
+# can't start (e.g. yt_dlp not importable) and the pool is switched off
+_worker_pool_proven = False
+
+# Successful extractions (video_id -> (expires_at, result)), LRU-bounded.
+# Signed googlevideo URLs last ~6h, so an hour is well inside their lifetime.
+STREAM_CACHE_TTL = 3600
+STREAM_CACHE_MAX_ENTRIES = 512
+_stream_cache = OrderedDict()
+_stream_cache_lock = threading.RLock()
+
+def get_worker_pool():
+    """Return the shared yt-dlp worker pool, or None if it cannot be started"""
+    global _worker_pool, WorkerPool
+    if _worker_pool is None and WorkerPool is not None:
+        with _worker_pool_lock:
+            if _worker_pool is None:
+                try:
+                    _worker_pool = WorkerPool()
+                except OSError as e:
+                    log(f"⚠️ yt-dlp worker pool unavailable: {e}")
+                    WorkerPool = None
+    return _worker_pool
+
+def _disable_worker_pool(reason):
+    """Stop using the worker pool for the rest of the process's lifetime"""
+    global _worker_pool, WorkerPool
+    with _worker_pool_lock:
+        pool, _worker_pool, WorkerPool = _worker_pool, None, None
+    if pool is not None:
+        pool.close()
+    log(f"⚠️ yt-dlp worker pool disabled, using the subprocess from now on: {reason}")
+
+def run_ytdlp_pooled(youtube_url):
+    """Extract info through a pooled worker; None means fall back to the subprocess"""
+    global _worker_pool_proven
+    pool = get_worker_pool()
+    if pool is None:
+        return None
+    opts = dict(YDL_OPTS)
+    if os.path.exists(COOKIES_FILE):
+        opts['cookiefile'] = COOKIES_FILE
+    try:
+        info = pool.extract_info(youtube_url, opts, REQUEST_TIMEOUT)
+    except ExtractError:
+        _worker_pool_proven = True
+        raise
+    except WorkerTimeout:
+        raise
+    except WorkerError as e:
+        # Workers that die before ever replying would otherwise be respawned
+        # (and die again) on every request
+        if not _worker_pool_proven:
+            _disable_worker_pool(e)
+        raise
+    _worker_pool_proven = True
+    return info
+
+# Log lines are queued and written by a background thread that keeps the
+# day's file open, so request threads never open/append/close the log file
+LOG_FLUSH_INTERVAL = 0.5
+_LOG_QUEUE = queue.Queue()
+_LOG_STOP = object()
+
+def _log_writer():
+    """Drain the log queue into proxy_<date>.log, reopening when the date changes"""
+    fh = None
+    day = None
+    last_flush = time.monotonic()
+    while True:
+        try:
+            item = _LOG_QUEUE.get(timeout=LOG_FLUSH_INTERVAL)
+        except queue.Empty:
+            item = None
+        try:
+            if item is _LOG_STOP:
+                if fh:
+                    fh.close()
+                return
+            line = None
+            if item is not None:
+                today, line = item
+                if today != day:
+                    if fh:
+                        fh.close()
+                    fh = open(os.path.join(LOG_DIR, f"proxy_{today}.log"), 'a')
+                    day = today
+                fh.write(line + '\n')
+            if fh and (line is None or time.monotonic() - last_flush >= LOG_FLUSH_INTERVAL):
+                fh.flush()
+                last_flush = time.monotonic()
+        except OSError:
+            fh = None
+            day = None
+
+_log_thread = threading.Thread(target=_log_writer, daemon=True)
+_log_thread.start()
+
+@atexit.register
+def _stop_log_writer():
+    _LOG_QUEUE.put(_LOG_STOP)
+    _log_thread.join(2)
+
+def _timestamp():
+    """Current local time as 'YYYY-MM-DD HH:MM:SS' (plain formatting, no strftime)"""
+    now = datetime.now()
+    return f"{now.year:04d}-{now.month:02d}-{now.day:02d} {now.hour:02d}:{now.minute:02d}:{now.second:02d}"
+
 def log(msg):
-    """Log message to stdout and file"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    """Log message to stdout and (via the writer thread) to the daily file"""
+    timestamp = _timestamp()
     log_line = f"[{timestamp}] {msg}"
     print(log_line, flush=True)
-    
-    try:
-        log_file = os.path.join(LOG_DIR, f"proxy_{datetime.now().strftime('%Y-%m-%d')}.log")
-        with open(log_file, 'a') as f:
-            f.write(log_line + '\n')
-    except:
-        pass
+    # The date prefix doubles as the log file's day, so the writer needn't format it again
+    _LOG_QUEUE.put_nowait((timestamp[:10], log_line))
 
 def extract_youtube_stream(video_id):
+    """Extract YouTube stream URL, serving repeat requests from the TTL LRU cache"""
+    with _stream_cache_lock:
+        cached = _stream_cache.get(video_id)
+        if cached and cached[0] > time.monotonic():
+            _stream_cache.move_to_end(video_id)
+            log(f"⚡ Cache HIT for {video_id}")
+            return dict(cached[1])
+        _stream_cache.pop(video_id, None)
+    
+    result = _extract_youtube_stream_uncached(video_id)
+    if result:
+        with _stream_cache_lock:
+            _stream_cache[video_id] = (time.monotonic() + STREAM_CACHE_TTL, dict(result))
+            _stream_cache.move_to_end(video_id)
+            while len(_stream_cache) > STREAM_CACHE_MAX_ENTRIES:
+                _stream_cache.popitem(last=False)
+    return result
+
+def _extract_youtube_stream_uncached(video_id):
     """Extract YouTube stream URL using yt-dlp"""
     log_entry = {
         "video_id": video_id,
-        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "timestamp": _timestamp(),
         "stdout": "",
         "stderr": "",
         "success": False
@@ -63,59 +285,44 @@ def extract_youtube_stream(video_id):
     try:
         youtube_url = f"https://www.youtube.com/watch?v={video_id}"
         
-        cmd = [
-            YT_DLP_PATH,
-            youtube_url,
-            "--no-cache-dir",
-            "--no-check-certificate",
-            "--dump-single-json",
-            "--no-playlist",
-            "-f", "best[ext=mp4][protocol^=http]/best[protocol^=http]"
-        ]
+        try:
+            data = run_ytdlp_pooled(youtube_url)
+        except (WorkerTimeout, ExtractError) as e:
+            log(f"yt-dlp error: {str(e)[:200]}")
+            log_entry["stderr"] = str(e)[:1000]
+            ytdlp_logs.append(log_entry)
+            if len(ytdlp_logs) > 10:
+                ytdlp_logs.pop(0)
+            return None
+        except WorkerError as e:
+            # Worker could not run (e.g. yt_dlp not importable); use the binary
+            log(f"⚠️ yt-dlp worker failed, falling back to subprocess: {e}")
+            data = None
+        if data is not None:
+            return _stream_result(video_id, data, log_entry)
+        
+        cmd = YT_DLP_CMD_PREFIX + [youtube_url]
         
         # Add cookies if file exists
         if os.path.exists(COOKIES_FILE):
             cmd.extend(["--cookies", COOKIES_FILE])
         
         log(f"Running: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=REQUEST_TIMEOUT)
+        # stdout stays bytes: _json_loads parses it without a str decode
+        result = subprocess.run(cmd, capture_output=True, timeout=REQUEST_TIMEOUT)
         
-        log_entry["stdout"] = result.stdout[:1000]
-        log_entry["stderr"] = result.stderr[:1000]
+        log_entry["stdout"] = result.stdout[:1000].decode('utf-8', 'replace')
+        log_entry["stderr"] = result.stderr[:1000].decode('utf-8', 'replace')
         
         if result.returncode != 0:
-            log(f"yt-dlp error (code {result.returncode}): {result.stderr[:200]}")
+            log(f"yt-dlp error (code {result.returncode}): {log_entry['stderr'][:200]}")
             ytdlp_logs.append(log_entry)
             if len(ytdlp_logs) > 10:
                 ytdlp_logs.pop(0)
             return None
         
-        data = json.loads(result.stdout)
-        stream_url = data.get('url')
-        
-        if not stream_url:
-            log("No URL found in yt-dlp output")
-            ytdlp_logs.append(log_entry)
-            if len(ytdlp_logs) > 10:
-                ytdlp_logs.pop(0)
-            return None
-            
-        log_entry["success"] = True
-        ytdlp_logs.append(log_entry)
-        if len(ytdlp_logs) > 10:
-            ytdlp_logs.pop(0)
-        
-        return {
-            "title": data.get('title', 'Unknown'),
-            "url": stream_url,
-            "thumbnail": data.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"),
-            "duration": str(data.get('duration', 0)),
-            "uploader": data.get('uploader', 'Unknown'),
-            "id": video_id,
-            "videoId": video_id,
-            "format_id": data.get('format_id'),
-            "ext": data.get('ext', 'mp4')
-        }
+        data = _json_loads(result.stdout)
+        return _stream_result(video_id, data, log_entry)
         
     except subprocess.TimeoutExpired:
         log("yt-dlp timeout")
@@ -132,9 +339,39 @@ def extract_youtube_stream(video_id):
             ytdlp_logs.pop(0)
         return None
 
+def _stream_result(video_id, data, log_entry):
+    """Build the API result from yt-dlp info and record the log entry"""
+    stream_url = data.get('url')
+    
+    if not stream_url:
+        log("No URL found in yt-dlp output")
+        ytdlp_logs.append(log_entry)
+        if len(ytdlp_logs) > 10:
+            ytdlp_logs.pop(0)
+        return None
+        
+    log_entry["success"] = True
+    ytdlp_logs.append(log_entry)
+    if len(ytdlp_logs) > 10:
+        ytdlp_logs.pop(0)
+    
+    return {
+        "title": data.get('title', 'Unknown'),
+        "url": stream_url,
+        "thumbnail": data.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"),
+        "duration": str(data.get('duration', 0)),
+        "uploader": data.get('uploader', 'Unknown'),
+        "id": video_id,
+        "videoId": video_id,
+        "format_id": data.get('format_id'),
+        "ext": data.get('ext', 'mp4')
+    }
+
 @app.route('/api/stream/<video_id>', methods=['GET'])
 def get_stream(video_id):
     """Extract and return YouTube stream URL"""
+    if not valid_video_id(video_id):
+        return json_error(ERR_INVALID_ID, 400)
     log(f"🎥 API Request: /api/stream/{video_id} from {request.remote_addr}")
     
     result = extract_youtube_stream(video_id)
@@ -156,7 +393,7 @@ def get_stream(video_id):
         return jsonify(result), 200
     else:
         log(f"❌ Failed extraction for {video_id}")
-        return jsonify({"error": "Failed to extract stream"}), 500
+        return json_error(ERR_EXTRACT_FAILED, 500)
 
 @app.route('/ytdlp', methods=['GET'])
 def ytdlp_endpoint():
@@ -164,7 +401,9 @@ def ytdlp_endpoint():
     video_id = request.args.get('id')
     
     if not video_id:
-        return jsonify({"error": "Missing 'id' parameter"}), 400
+        return json_error(ERR_MISSING_ID, 400)
+    if not valid_video_id(video_id):
+        return json_error(ERR_INVALID_ID, 400)
     
     log(f"🎬 yt-dlp request for video ID: {video_id}")
     result = extract_youtube_stream(video_id)
@@ -174,7 +413,7 @@ def ytdlp_endpoint():
         return jsonify(result), 200
     else:
         log(f"❌ yt-dlp extraction failed for {video_id}")
-        return jsonify({"error": "Failed to extract stream URL"}), 500
+        return json_error(ERR_EXTRACT_URL_FAILED, 500)
 
 @app.route('/stream', methods=['GET'])
 @app.route('/streamytlink', methods=['GET'])
@@ -183,7 +422,7 @@ def stream_relay():
     target_url = request.args.get('url')
     
     if not target_url:
-        return jsonify({"error": "Missing 'url' parameter"}), 400
+        return json_error(ERR_MISSING_URL, 400)
     
     log(f"📥 Relay Request for: {target_url[:60]}...")
     
@@ -233,22 +472,31 @@ def get_logs():
     """Get recent yt-dlp logs"""
     return jsonify({"logs": ytdlp_logs}), 200
 
+# The playground page is read once at import instead of on every request
+try:
+    with open(os.path.join(os.path.dirname(__file__), 'playground.html'), 'rb') as f:
+        PLAYGROUND_HTML = f.read()
+    PLAYGROUND_ETAG = hashlib.blake2b(PLAYGROUND_HTML, digest_size=8).hexdigest()
+except OSError:
+    PLAYGROUND_HTML = PLAYGROUND_ETAG = None
+
 @app.route('/playground', methods=['GET'])
 def playground():
     """Serve the playground UI"""
-    playground_path = os.path.join(os.path.dirname(__file__), 'playground.html')
-    if os.path.exists(playground_path):
-        with open(playground_path, 'r') as f:
-            return f.read()
-    return "Playground not available", 404
+    if PLAYGROUND_HTML is None:
+        return "Playground not available", 404
+    response = Response(PLAYGROUND_HTML, mimetype='text/html')
+    response.set_etag(PLAYGROUND_ETAG)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
 
 @app.errorhandler(404)
 def not_found(e):
-    return jsonify({"error": "Endpoint not found"}), 404
+    return json_error(ERR_NOT_FOUND, 404)
 
 @app.errorhandler(500)
 def internal_error(e):
-    return jsonify({"error": "Internal server error"}), 500
+    return json_error(ERR_INTERNAL, 500)
 
 if __name__ == '__main__':
     # Local development
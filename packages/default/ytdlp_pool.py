@@ -0,0 +1,170 @@
+"""
+Persistent yt-dlp worker processes
+Each worker imports yt_dlp once and serves extraction jobs over stdin/stdout
+JSON lines, so requests skip the interpreter start-up and yt_dlp import that a
+one-shot `yt-dlp` subprocess pays on every call.
+"""
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+# orjson when available for the replies (a full info dict is often 100KB+)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Worker loop: one JSON job per stdin line, one JSON reply per stdout line.
+# YoutubeDL instances are reused across jobs with identical options.
+_WORKER_SOURCE = r'''
+import json, sys
+import yt_dlp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:  # e.g. non-str keys; the stdlib encoder copes
+            pass
+    return json.dumps(obj)
+
+_ydls = {}
+for line in sys.stdin:
+    try:
+        job = json.loads(line)
+        key = json.dumps(job['opts'], sort_keys=True)
+        ydl = _ydls.get(key)
+        if ydl is None:
+            ydl = _ydls[key] = yt_dlp.YoutubeDL(job['opts'])
+        info = ydl.sanitize_info(ydl.extract_info(job['url'], download=False))
+        reply = {'ok': True, 'info': info}
+    except Exception as e:
+        reply = {'ok': False, 'error': str(e)}
+    sys.stdout.write(_dumps(reply) + '\n')
+    sys.stdout.flush()
+'''
+
+
+def default_pool_size():
+    """min(cpu_count, 2 * gunicorn workers), overridable via YTDLP_POOL_SIZE"""
+    if os.environ.get('YTDLP_POOL_SIZE'):
+        return max(1, int(os.environ['YTDLP_POOL_SIZE']))
+    web_workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+    return max(1, min(os.cpu_count() or 1, web_workers * 2))
+
+
+class WorkerError(Exception):
+    """Raised when a worker dies or returns an unreadable reply"""
+
+
+class WorkerTimeout(WorkerError):
+    """Raised when a job exceeds its timeout (the worker is killed)"""
+
+
+class ExtractError(Exception):
+    """yt-dlp itself reported an error for the job"""
+
+
+class Worker:
+    """One long-lived `python -c <worker loop>` child process"""
+
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, '-c', _WORKER_SOURCE],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        self.lock = threading.Lock()
+        self.timed_out = False
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, url, opts, timeout):
+        """Send one job and wait for its reply; the worker is killed on timeout"""
+        with self.lock:
+            timer = threading.Timer(timeout, self._on_timeout)
+            timer.start()
+            try:
+                self.proc.stdin.write(json.dumps({'url': url, 'opts': opts}) + '\n')
+                self.proc.stdin.flush()
+                line = self.proc.stdout.readline()
+            except (BrokenPipeError, OSError) as e:
+                raise WorkerError(f'worker pipe closed: {e}')
+            finally:
+                timer.cancel()
+            if not line:
+                if self.timed_out:
+                    raise WorkerTimeout(f'no reply within {timeout}s')
+                raise WorkerError(f'worker exited (rc={self.proc.poll()})')
+            try:
+                return _json_loads(line)
+            except ValueError as e:  # json.JSONDecodeError and orjson.JSONDecodeError
+                raise WorkerError(f'bad worker reply: {e}')
+
+    def _on_timeout(self):
+        self.timed_out = True
+        self.kill()
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.wait(5)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+
+class WorkerPool:
+    """Fixed-size pool of yt-dlp workers; dead workers are respawned on checkout"""
+
+    def __init__(self, size=None):
+        self.size = size or default_pool_size()
+        self._idle = queue.Queue()
+        for _ in range(self.size):
+            self._idle.put(Worker())
+
+    def acquire(self):
+        worker = self._idle.get()
+        if not worker.alive():
+            worker = Worker()
+        return worker
+
+    def release(self, worker):
+        self._idle.put(worker if worker.alive() else Worker())
+
+    def extract_info(self, url, opts, timeout):
+        """Run extract_info(url) in a worker and return the info dict
+
+        Raises ExtractError for yt-dlp errors and WorkerError if the worker failed.
+        """
+        worker = self.acquire()
+        try:
+            reply = worker.run(url, opts, timeout)
+        except WorkerError:
+            worker.kill()
+            raise
+        finally:
+            self.release(worker)
+        if not reply.get('ok'):
+            raise ExtractError(reply.get('error', 'unknown yt-dlp error'))
+        return reply['info']
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.proc.stdin.close()
+            worker.kill()
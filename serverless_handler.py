@@ -4,44 +4,161 @@ Wrapper for YouTube Stream URL extraction and proxying
 """
 
 import json
+import re
+import hashlib
 import subprocess
 import os
+import queue
+import threading
+import time
+import atexit
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs, quote
 from flask import Flask, request, jsonify, Response
+from flask.json.provider import DefaultJSONProvider
 import requests
 
+# orjson when available (much faster on large yt-dlp JSON); stdlib json otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
 app = Flask(__name__)
 
+# /api/stream and /ytdlp reply with the whole yt-dlp info dict; this provider
+# lets jsonify() encode it with orjson straight to bytes
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+    
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# YouTube video IDs are exactly 11 characters of [A-Za-z0-9_-]; anything else
+# is rejected before it can reach yt-dlp
+VIDEO_ID_RE = re.compile(r'[A-Za-z0-9_-]{11}')
+
+def valid_video_id(video_id):
+    return video_id is not None and VIDEO_ID_RE.fullmatch(video_id) is not None
+
+# Fixed error replies, encoded once at import and returned as-is by json_error().
+# The catch-all 404 is the busy one: every probe of an unknown path ends there
+def _error_body(message):
+    return json.dumps({"error": message}, separators=(',', ':')).encode() + b'\n'
+
+def json_error(body, status):
+    """Return a pre-serialized JSON error body"""
+    return Response(body, status=status, mimetype='application/json')
+
+ERR_EXTRACT_FAILED = _error_body("Failed to extract stream")
+ERR_EXTRACT_URL_FAILED = _error_body("Failed to extract stream URL")
+ERR_MISSING_ID = _error_body("Missing 'id' parameter")
+ERR_INVALID_ID = _error_body("Invalid video ID")
+ERR_MISSING_URL = _error_body("Missing 'url' parameter")
+ERR_NOT_FOUND = _error_body("Endpoint not found")
+ERR_INTERNAL = _error_body("Internal server error")
+
 # Configuration
 COOKIES_FILE = os.environ.get('COOKIES_FILE', '/tmp/cookies.txt')
 YT_DLP_PATH = os.environ.get('YT_DLP_PATH', 'yt-dlp')
 LOG_DIR = os.environ.get('LOG_DIR', '/tmp/proxyLogs')
 REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', '45'))
 
+# Invariant part of the yt-dlp command, built once (URL/cookies appended per call)
+YT_DLP_CMD_PREFIX = [
+    YT_DLP_PATH,
+    "--no-cache-dir",
+    "--no-check-certificate",
+    "--dump-single-json",
+    "--no-playlist",
+    "-f", "best[ext=mp4][protocol^=http]/best[protocol^=http]"
+]
+
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # Store recent yt-dlp execution logs (last 10)
 ytdlp_logs = []
 
+# Log lines are queued and written by a background thread that keeps the
+# day's file open, so request threads never open/append/close the log file
+LOG_FLUSH_INTERVAL = 0.5
+_LOG_QUEUE = queue.Queue()
+_LOG_STOP = object()
+
+def _log_writer():
+    """Drain the log queue into proxy_<date>.log, reopening when the date changes"""
+    fh = None
+    day = None
+    last_flush = time.monotonic()
+    while True:
+        try:
+            item = _LOG_QUEUE.get(timeout=LOG_FLUSH_INTERVAL)
+        except queue.Empty:
+            item = None
+        try:
+            if item is _LOG_STOP:
+                if fh:
+                    fh.close()
+                return
+            line = None
+            if item is not None:
+                today, line = item
+                if today != day:
+                    if fh:
+                        fh.close()
+                    fh = open(os.path.join(LOG_DIR, f"proxy_{today}.log"), 'a')
+                    day = today
+                fh.write(line + '\n')
+            if fh and (line is None or time.monotonic() - last_flush >= LOG_FLUSH_INTERVAL):
+                fh.flush()
+                last_flush = time.monotonic()
+        except OSError:
+            fh = None
+            day = None
+
+_log_thread = threading.Thread(target=_log_writer, daemon=True)
+_log_thread.start()
+
+@atexit.register
+def _stop_log_writer():
+    _LOG_QUEUE.put(_LOG_STOP)
+    _log_thread.join(2)
+
+def _timestamp():
+    """Current local time as 'YYYY-MM-DD HH:MM:SS' (plain formatting, no strftime)"""
+    now = datetime.now()
+    return f"{now.year:04d}-{now.month:02d}-{now.day:02d} {now.hour:02d}:{now.minute:02d}:{now.second:02d}"
+
 def log(msg):
-    """Log message to stdout and file"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    """Log message to stdout and (via the writer thread) to the daily file"""
+    timestamp = _timestamp()
     log_line = f"[{timestamp}] {msg}"
     print(log_line, flush=True)
-    
-    try:
-        log_file = os.path.join(LOG_DIR, f"proxy_{datetime.now().strftime('%Y-%m-%d')}.log")
-        with open(log_file, 'a') as f:
-            f.write(log_line + '\n')
-    except:
-        pass
+    # The date prefix doubles as the log file's day, so the writer needn't format it again
+    _LOG_QUEUE.put_nowait((timestamp[:10], log_line))
 
 def extract_youtube_stream(video_id):
     """Extract YouTube stream URL using yt-dlp"""
     log_entry = {
         "video_id": video_id,
-        "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "timestamp": _timestamp(),
         "stdout": "",
         "stderr": "",
         "success": False
@@ -50,34 +167,27 @@ def extract_youtube_stream(video_id):
     try:
         youtube_url = f"https://www.youtube.com/watch?v={video_id}"
         
-        cmd = [
-            YT_DLP_PATH,
-            youtube_url,
-            "--no-cache-dir",
-            "--no-check-certificate",
-            "--dump-single-json",
-            "--no-playlist",
-            "-f", "best[ext=mp4][protocol^=http]/best[protocol^=http]"
-        ]
+        cmd = YT_DLP_CMD_PREFIX + [youtube_url]
         
         # Add cookies if file exists
         if os.path.exists(COOKIES_FILE):
             cmd.extend(["--cookies", COOKIES_FILE])
         
         log(f"Running: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=REQUEST_TIMEOUT)
+        # stdout stays bytes: _json_loads parses it without a str decode
+        result = subprocess.run(cmd, capture_output=True, timeout=REQUEST_TIMEOUT)
         
-        log_entry["stdout"] = result.stdout[:1000]
-        log_entry["stderr"] = result.stderr[:1000]
+        log_entry["stdout"] = result.stdout[:1000].decode('utf-8', 'replace')
+        log_entry["stderr"] = result.stderr[:1000].decode('utf-8', 'replace')
         
         if result.returncode != 0:
-            log(f"yt-dlp error (code {result.returncode}): {result.stderr[:200]}")
+            log(f"yt-dlp error (code {result.returncode}): {log_entry['stderr'][:200]}")
             ytdlp_logs.append(log_entry)
             if len(ytdlp_logs) > 10:
                 ytdlp_logs.pop(0)
             return None
         
-        data = json.loads(result.stdout)
+        data = _json_loads(result.stdout)
         stream_url = data.get('url')
         
         if not stream_url:
@@ -122,6 +232,8 @@ def extract_youtube_stream(video_id):
 @app.route('/api/stream/<video_id>', methods=['GET'])
 def get_stream(video_id):
     """Extract and return YouTube stream URL"""
+    if not valid_video_id(video_id):
+        return json_error(ERR_INVALID_ID, 400)
     log(f"🎥 API Request: /api/stream/{video_id} from {request.remote_addr}")
     
     result = extract_youtube_stream(video_id)
@@ -139,11 +251,21 @@ def get_stream(video_id):
         except Exception as e:
             log(f"⚠️ Rewrite Error: {e}")
         
+        # Strong validator over the (rewritten) stream URL: repeat requests for
+        # an unchanged URL get a 304 instead of the full payload
+        etag = hashlib.blake2b(result.get('url', '').encode(), digest_size=8).hexdigest()
+        if request.if_none_match.contains(etag):
+            log(f"✅ Not modified: {video_id}")
+            return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'public, max-age=600'}
+        
         log(f"✅ Sent response for {video_id}")
-        return jsonify(result), 200
+        response = jsonify(result)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, max-age=600'
+        return response, 200
     else:
         log(f"❌ Failed extraction for {video_id}")
-        return jsonify({"error": "Failed to extract stream"}), 500
+        return json_error(ERR_EXTRACT_FAILED, 500)
 
 @app.route('/ytdlp', methods=['GET'])
 def ytdlp_endpoint():
@@ -151,7 +273,9 @@ def ytdlp_endpoint():
     video_id = request.args.get('id')
     
     if not video_id:
-        return jsonify({"error": "Missing 'id' parameter"}), 400
+        return json_error(ERR_MISSING_ID, 400)
+    if not valid_video_id(video_id):
+        return json_error(ERR_INVALID_ID, 400)
     
     log(f"🎬 yt-dlp request for video ID: {video_id}")
     result = extract_youtube_stream(video_id)
@@ -161,7 +285,7 @@ def ytdlp_endpoint():
         return jsonify(result), 200
     else:
         log(f"❌ yt-dlp extraction failed for {video_id}")
-        return jsonify({"error": "Failed to extract stream URL"}), 500
+        return json_error(ERR_EXTRACT_URL_FAILED, 500)
 
 @app.route('/stream', methods=['GET'])
 @app.route('/streamytlink', methods=['GET'])
@@ -170,7 +294,7 @@ def stream_relay():
     target_url = request.args.get('url')
     
     if not target_url:
-        return jsonify({"error": "Missing 'url' parameter"}), 400
+        return json_error(ERR_MISSING_URL, 400)
     
     log(f"📥 Relay Request for: {target_url[:60]}...")
     
@@ -220,22 +344,31 @@ def get_logs():
     """Get recent yt-dlp logs"""
     return jsonify({"logs": ytdlp_logs}), 200
 
+# The playground page is read once at import instead of on every request
+try:
+    with open(os.path.join(os.path.dirname(__file__), 'playground.html'), 'rb') as f:
+        PLAYGROUND_HTML = f.read()
+    PLAYGROUND_ETAG = hashlib.blake2b(PLAYGROUND_HTML, digest_size=8).hexdigest()
+except OSError:
+    PLAYGROUND_HTML = PLAYGROUND_ETAG = None
+
 @app.route('/playground', methods=['GET'])
 def playground():
     """Serve the playground UI"""
-    playground_path = os.path.join(os.path.dirname(__file__), 'playground.html')
-    if os.path.exists(playground_path):
-        with open(playground_path, 'r') as f:
-            return f.read()
-    return "Playground not available", 404
+    if PLAYGROUND_HTML is None:
+        return "Playground not available", 404
+    response = Response(PLAYGROUND_HTML, mimetype='text/html')
+    response.set_etag(PLAYGROUND_ETAG)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
 
 @app.errorhandler(404)
 def not_found(e):
-    return jsonify({"error": "Endpoint not found"}), 404
+    return json_error(ERR_NOT_FOUND, 404)
 
 @app.errorhandler(500)
 def internal_error(e):
-    return jsonify({"error": "Internal server error"}), 500
+    return json_error(ERR_INTERNAL, 500)
 
 if __name__ == '__main__':
     # Local development
@@ -15,13 +15,24 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # Store recent yt-dlp execution logs (last 10)
 ytdlp_logs = []
 
+# [day, path] of today's log file, recomputed only when the date rolls over
+_log_file = [None, None]
+
+def _timestamp():
+    """Current local time as 'YYYY-MM-DD HH:MM:SS' (plain formatting, no strftime)"""
+    now = datetime.now()
+    return f"{now.year:04d}-{now.month:02d}-{now.day:02d} {now.hour:02d}:{now.minute:02d}:{now.second:02d}"
+
 def log(msg):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    timestamp = _timestamp()
     log_line = f"[{timestamp}] {msg}"
     print(log_line, flush=True)
     
     # Also write to file (daily log)
-    log_file = os.path.join(LOG_DIR, f"proxy_{datetime.now().strftime('%Y-%m-%d')}.log")
+    day = timestamp[:10]
+    if _log_file[0] != day:
+        _log_file[:] = [day, os.path.join(LOG_DIR, f"proxy_{day}.log")]
+    log_file = _log_file[1]
     try:
         with open(log_file, 'a') as f:
             f.write(log_line + '\n')
@@ -37,7 +48,7 @@ COOKIES_FILE = "/root/cookies.txt"  # Path to YouTube cookies
 def extract_youtube_stream(video_id):
     """Extract YouTube stream URL using yt-dlp (Reference Implementation Logic)"""
     global ytdlp_logs
-    log_entry = {"video_id": video_id, "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "stdout": "", "stderr": "", "success": False}
+    log_entry = {"video_id": video_id, "timestamp": _timestamp(), "stdout": "", "stderr": "", "success": False}
     
     try:
         youtube_url = f"https://www.youtube.com/watch?v={video_id}"
@@ -4,8 +4,22 @@ Basic tests for the serverless handler
 
 import pytest
 import json
+import os
+import sys
+import importlib.util
+import requests
 from serverless_handler import app, extract_youtube_stream
 
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DO_DIR = os.path.join(REPO_DIR, 'packages', 'default', 'serverless_handler')
+
+def _load(name, path):
+    """Import a module by file path (the DO files share names with the root ones)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
 @pytest.fixture
 def client():
     app.config['TESTING'] = True
@@ -41,10 +55,249 @@ def test_logs_endpoint(client):
     assert 'logs' in data
     assert isinstance(data['logs'], list)
 
+def test_stream_etag_not_modified(client, monkeypatch):
+    """Test conditional GET on stream endpoint returns 304"""
+    import serverless_handler
+    monkeypatch.setattr(serverless_handler, 'extract_youtube_stream',
+                        lambda video_id: {'url': 'https://example.com/v.mp4', 'id': video_id})
+    response = client.get('/api/stream/dQw4w9WgXcQ')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'public, max-age=600'
+    etag = response.headers['ETag']
+    response = client.get('/api/stream/dQw4w9WgXcQ', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
 def test_not_found(client):
     """Test 404 error handling"""
     response = client.get('/nonexistent')
     assert response.status_code == 404
 
+# --- Proxy response cache (api/proxy_cache.py) ---
+
+class _Upstream:
+    """Minimal stand-in for a streamed requests.Response"""
+    def __init__(self, headers, body=b'ok', status_code=200):
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.raw = type('Raw', (), {'headers': self.headers})()
+        self.content = body
+    
+    def close(self):
+        pass
+    
+    def iter_content(self, chunk_size):
+        yield self.content
+
+@pytest.fixture
+def proxy(monkeypatch):
+    """api/proxy.py test client plus the upstream calls it made"""
+    proxy_app = _load('vercel_proxy', os.path.join(REPO_DIR, 'api', 'proxy.py'))
+    import proxy_cache
+    proxy_cache._http_cache.clear()
+    proxy_cache._neg_cache.clear()
+    calls = []
+    def upstream(headers):
+        def request(**kwargs):
+            calls.append(kwargs)
+            return _Upstream(headers)
+        monkeypatch.setattr(proxy_cache._SESSION, 'request', request)
+    proxy_app.app.config['TESTING'] = True
+    with proxy_app.app.test_client() as client:
+        yield client, upstream, calls, proxy_cache
+
+def test_proxy_cache_hit_and_expiry(proxy):
+    """Test cacheable upstream responses are served from cache until they expire"""
+    client, upstream, calls, proxy_cache = proxy
+    upstream({'Cache-Control': 'max-age=60', 'Content-Length': '2'})
+    assert client.get('/asset.js').headers['X-Proxy-Cache'] == 'MISS'
+    response = client.get('/asset.js')
+    assert response.headers['X-Proxy-Cache'] == 'HIT'
+    assert response.data == b'ok'
+    assert len(calls) == 1
+    for entry in proxy_cache._http_cache.values():
+        entry['expires'] = 0
+    assert client.get('/asset.js').headers['X-Proxy-Cache'] == 'MISS'
+    assert len(calls) == 2
+
+def test_proxy_cache_skips_set_cookie(proxy):
+    """Test responses carrying Set-Cookie are never stored and replayed"""
+    client, upstream, calls, proxy_cache = proxy
+    upstream({'Cache-Control': 'max-age=60', 'Content-Length': '2', 'Set-Cookie': 'session=abc'})
+    for _ in range(2):
+        response = client.get('/account')
+        assert 'X-Proxy-Cache' not in response.headers
+        assert response.data == b'ok'  # streamed: consume it inside the request
+    assert len(calls) == 2
+    assert not proxy_cache._http_cache
+
+def test_proxy_cache_bypassed_for_range(proxy):
+    """Test Range requests neither read nor populate the cache"""
+    client, upstream, calls, proxy_cache = proxy
+    upstream({'Cache-Control': 'max-age=60', 'Content-Length': '2'})
+    assert client.get('/video.mp4').headers['X-Proxy-Cache'] == 'MISS'
+    response = client.get('/video.mp4', headers={'Range': 'bytes=0-0'})
+    assert 'X-Proxy-Cache' not in response.headers
+    assert response.data == b'ok'  # streamed: consume it inside the request
+    assert calls[-1]['headers']['Range'] == 'bytes=0-0'
+    response = client.get('/other.mp4', headers={'Range': 'bytes=0-0'})
+    assert response.data == b'ok'
+    assert list(proxy_cache._http_cache) == [('GET', 'http://localhost/video.mp4')]
+    assert len(calls) == 3
+
+# --- DO helper (packages/default/serverless_handler/serverless_handler_local.py) ---
+
+@pytest.fixture(scope='module')
+def do_helper():
+    return _load('do_serverless_handler_local', os.path.join(DO_DIR, 'serverless_handler_local.py'))
+
+def _printed(*values):
+    return json.dumps(list(values)).encode() + b'\n'
+
+def test_parse_printed_fields(do_helper):
+    """Test -O output keeps a literal NA and newlines, dropping missing fields"""
+    stdout = _printed('https://example.com/v.mp4', '18', 'mp4', 212, None, 'NA', 'Line one\nline two')
+    assert do_helper._parse_printed(stdout) == {
+        'url': 'https://example.com/v.mp4', 'format_id': '18', 'ext': 'mp4',
+        'duration': 212, 'uploader': 'NA', 'title': 'Line one\nline two'}
+
+def test_parse_printed_rejects_unexpected_output(do_helper):
+    """Test output that isn't the printed field array is rejected"""
+    assert do_helper._parse_printed(b'WARNING: something\n') is None
+    assert do_helper._parse_printed(_printed('https://example.com/v.mp4')) is None
+    assert do_helper._parse_printed(b'{"url": "https://example.com/v.mp4"}') is None
+
+def test_subprocess_falls_back_to_json_dump(do_helper, monkeypatch):
+    """Test unparseable -O output is retried once with --dump-single-json"""
+    commands = []
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        stdout = b'garbage' if len(commands) == 1 else json.dumps({'url': 'https://example.com/v.mp4'}).encode()
+        return type('Completed', (), {'returncode': 0, 'stdout': stdout, 'stderr': b''})()
+    monkeypatch.setattr(do_helper, 'USE_WORKER_POOL', False)
+    monkeypatch.setattr(do_helper, 'run_ytdlp_inprocess', lambda url: None)
+    monkeypatch.setattr(do_helper.subprocess, 'run', run)
+    result = do_helper.extract_youtube_stream('dQw4w9WgXcQ')
+    assert result['url'] == 'https://example.com/v.mp4'
+    assert len(commands) == 2
+    assert '--dump-single-json' in commands[1]
+
+def test_pool_error_before_first_reply_disables_pool(do_helper, monkeypatch):
+    """Test a pool whose workers can't start is dropped for the subprocess"""
+    class BrokenPool:
+        closed = False
+        def extract_info(self, url, opts, timeout):
+            raise do_helper.WorkerError('worker exited (rc=1)')
+        def close(self):
+            self.closed = True
+    pool = BrokenPool()
+    monkeypatch.setattr(do_helper, '_worker_pool', pool)
+    monkeypatch.setattr(do_helper, '_worker_pool_proven', False)
+    monkeypatch.setattr(do_helper, 'WorkerPool', type(pool))
+    with pytest.raises(do_helper.WorkerError):
+        do_helper.run_ytdlp_pooled('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+    assert pool.closed
+    assert do_helper.WorkerPool is None
+    assert do_helper.run_ytdlp_pooled('https://www.youtube.com/watch?v=dQw4w9WgXcQ') is None
+
+# --- yt-dlp worker pool (packages/default/ytdlp_pool.py) ---
+
+_FAKE_WORKER = r'''
+import json, sys, time
+for line in sys.stdin:
+    job = json.loads(line)
+    if job['url'] == 'hang':
+        time.sleep(30)
+    if job['url'] == 'die':
+        sys.exit(1)
+    reply = {'ok': False, 'error': 'unavailable'} if job['url'] == 'fail' else {'ok': True, 'info': {'url': job['url']}}
+    sys.stdout.write(json.dumps(reply) + '\n')
+    sys.stdout.flush()
+'''
+
+@pytest.fixture
+def worker_pool(monkeypatch):
+    ytdlp_pool = _load('ytdlp_pool_under_test', os.path.join(REPO_DIR, 'packages', 'default', 'ytdlp_pool.py'))
+    monkeypatch.setattr(ytdlp_pool, '_WORKER_SOURCE', _FAKE_WORKER)
+    pool = ytdlp_pool.WorkerPool(size=1)
+    yield pool, ytdlp_pool
+    pool.close()
+
+def test_worker_pool_timeout_respawns(worker_pool):
+    """Test a hung job raises WorkerTimeout and the next job gets a fresh worker"""
+    pool, ytdlp_pool = worker_pool
+    with pytest.raises(ytdlp_pool.WorkerTimeout):
+        pool.extract_info('hang', {}, 0.5)
+    assert pool.extract_info('ok', {}, 10) == {'url': 'ok'}
+
+def test_worker_pool_dead_worker_respawns(worker_pool):
+    """Test a worker that exits raises WorkerError and is replaced"""
+    pool, ytdlp_pool = worker_pool
+    with pytest.raises(ytdlp_pool.WorkerError):
+        pool.extract_info('die', {}, 10)
+    assert pool.extract_info('ok', {}, 10) == {'url': 'ok'}
+
+def test_worker_pool_extract_error(worker_pool):
+    """Test yt-dlp errors surface as ExtractError, keeping the worker"""
+    pool, ytdlp_pool = worker_pool
+    with pytest.raises(ytdlp_pool.ExtractError):
+        pool.extract_info('fail', {}, 10)
+    assert pool.extract_info('ok', {}, 10) == {'url': 'ok'}
+
+# --- DO function routing (packages/default/serverless_handler/__main__.py) ---
+
+@pytest.fixture(scope='module')
+def do_main(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('WARM_ON_IMPORT', '0')
+        mp.setenv('LOG_DIR', str(tmp_path_factory.mktemp('logs')))
+        yield _load('do_main', os.path.join(DO_DIR, '__main__.py'))
+
+@pytest.fixture
+def do_stream(do_main, monkeypatch):
+    """Stub the DO extractor; returns the ids it was asked for"""
+    requested = []
+    def extract(video_id):
+        requested.append(video_id)
+        return {'url': 'https://example.com/v.mp4', 'videoId': video_id}
+    monkeypatch.setattr(do_main, '_EXTRACTOR', extract)
+    do_main._STREAM_CACHE.clear()
+    yield requested
+    do_main._STREAM_CACHE.clear()
+
+def _invoke(do_main, path, query=None):
+    return do_main.main({'http': {'path': path}, 'query': query or {}})
+
+def test_do_route_stream(do_main, do_stream):
+    """Test /api/stream/<id> extracts once and serves repeats from the cache"""
+    for _ in range(2):
+        response = _invoke(do_main, '/api/stream/dQw4w9WgXcQ')
+        assert response['statusCode'] == 200
+        assert response['body']['videoId'] == 'dQw4w9WgXcQ'
+    assert do_stream == ['dQw4w9WgXcQ']
+    assert _invoke(do_main, '/api/stream/not-an-id')['statusCode'] == 400
+
+def test_do_route_static(do_main):
+    """Test paths containing /static/ serve playground assets, refusing traversal"""
+    response = _invoke(do_main, '/default/serverless_handler/static/playground.js')
+    assert response['statusCode'] == 200
+    assert 'javascript' in response['headers']['Content-Type']
+    assert _invoke(do_main, '/static/../__main__.py')['statusCode'] == 404
+    assert _invoke(do_main, '/static/missing.js')['statusCode'] == 404
+
+def test_do_route_debug(do_main):
+    """Test /debug/<name> dispatches to the named endpoint, 404 otherwise"""
+    response = _invoke(do_main, '/default/serverless_handler/debug/py')
+    assert response['statusCode'] == 200
+    assert 'yt_dlp' in response['body']
+    assert _invoke(do_main, '/debug/nope')['statusCode'] == 404
+
+def test_do_batch_limit(do_main, do_stream):
+    """Test /ytdlp/batch keeps input order and rejects more than 10 ids"""
+    ids = ['dQw4w9WgXc' + c for c in 'ABCDEFGHIJK']
+    response = _invoke(do_main, '/ytdlp/batch', {'ids': ','.join(ids[:3])})
+    assert response['statusCode'] == 200
+    assert [r['videoId'] for r in response['body']['results']] == ids[:3]
+    assert _invoke(do_main, '/ytdlp/batch', {'ids': ','.join(ids)})['statusCode'] == 400
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
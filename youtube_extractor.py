@@ -8,12 +8,147 @@ import json
 import subprocess
 import shutil
 import tempfile
+import hashlib
 import logging
-from functools import lru_cache
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from itertools import islice
+from urllib.parse import urlparse, parse_qs
+
+# orjson when available (much faster on large yt-dlp JSON); stdlib json otherwise
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+
+# Prefer the in-process yt-dlp API; fall back to `python -m yt_dlp` subprocesses
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
 
 # --- Logging Setup ---
 logger = logging.getLogger(__name__)
 
+# Stream extraction cache (googlevideo URLs stay valid for ~6h; keep well under that)
+STREAM_CACHE_TTL = 1800
+STREAM_CACHE_MAX_ENTRIES = 2048
+STREAM_URL_EXPIRY_MARGIN = 300  # Evict this long before the URL's own 'expire' param
+
+STREAM_FORMAT = 'best[ext=mp4][protocol^=http]/best[protocol^=http]'
+
+YT_WATCH_URL = 'https://www.youtube.com/watch?v='
+YT_THUMB_URL = 'https://img.youtube.com/vi/'
+
+# How often a resolved cookie source is re-stat'ed for changes
+COOKIE_RECHECK_INTERVAL = 30
+
+# Persistent yt-dlp cache (player JS, signature solutions) reused across calls
+YTDLP_CACHE_DIR = os.environ.get('YTDLP_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'yt-dlp-cache'))
+try:
+    os.makedirs(YTDLP_CACHE_DIR, exist_ok=True)
+except OSError:
+    pass
+
+
+def _find_node():
+    """Locate Node.js once (used by yt-dlp as JS runtime for signature solving)"""
+    node_path = shutil.which('node')
+    if node_path:
+        return node_path
+    for path in ['/usr/bin/node', '/usr/local/bin/node', '/bin/node']:
+        if os.path.exists(path):
+            return path
+    return None
+
+NODE_PATH = _find_node()
+
+# Invariant parts of the stream extraction, built once: in-process YoutubeDL
+# params and the `python -m yt_dlp` fallback command (URL/cookies appended per call)
+STREAM_YDL_PARAMS = {
+    'format': STREAM_FORMAT,
+    'noplaylist': True,
+    'nocheckcertificate': True
+}
+STREAM_CMD_PREFIX = [
+    sys.executable, "-m", "yt_dlp",
+    '--cache-dir', YTDLP_CACHE_DIR,
+    '--no-check-certificate',
+    '--dump-single-json',
+    '--no-playlist',
+    '-f', STREAM_FORMAT
+]
+if NODE_PATH:
+    STREAM_YDL_PARAMS['js_runtimes'] = {'node': {}}
+    STREAM_CMD_PREFIX.extend(['--js-runtimes', 'node'])
+
+# In-process extractions run on these threads so callers stop waiting after
+# the extractor's timeout: socket_timeout only bounds single reads, and one
+# extraction makes many requests. A timed-out call finishes in the background
+EXTRACT_MAX_WORKERS = int(os.environ.get('YT_EXTRACT_WORKERS', '8'))
+
+# Search results cache: 15 min TTL, scan-resistant (see _SearchCache)
+SEARCH_CACHE_TTL = 900
+SEARCH_CACHE_MAX_ENTRIES = 256
+
+
+class _SearchCache:
+    """Scan-resistant TTL cache for search results (segmented LRU)
+    
+    New queries enter a small probationary segment and are only promoted to the
+    protected segment on a second hit, so a burst of one-off queries churns the
+    probationary entries without evicting the popular ones.
+    """
+    
+    def __init__(self, max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl=SEARCH_CACHE_TTL):
+        self.ttl = ttl
+        self.protected_max = max_entries * 3 // 4
+        self.probation_max = max_entries - self.protected_max
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            for segment in (self._protected, self._probation):
+                entry = segment.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= time.monotonic():
+                    del segment[key]
+                    return None
+                if segment is self._probation:
+                    del self._probation[key]
+                    self._protected[key] = entry
+                    if len(self._protected) > self.protected_max:
+                        # Demote the coldest protected entry instead of dropping it
+                        self._insert_probation(*self._protected.popitem(last=False))
+                else:
+                    segment.move_to_end(key)
+                return entry[1]
+            return None
+    
+    def put(self, key, value):
+        with self._lock:
+            entry = (time.monotonic() + self.ttl, value)
+            if key in self._protected:
+                self._protected[key] = entry
+                self._protected.move_to_end(key)
+            else:
+                self._probation.pop(key, None)
+                self._insert_probation(key, entry)
+    
+    def _insert_probation(self, key, entry):
+        self._probation[key] = entry
+        while len(self._probation) > self.probation_max:
+            self._probation.popitem(last=False)
+
+
 class YoutubeExtractor:
     """Shared YouTube extraction logic for serverless and web apps"""
     
@@ -33,8 +168,33 @@ class YoutubeExtractor:
         # Cookie caching
         self.cookie_manager = {
             'path': None,
-            'loaded': False
+            'loaded': False,
+            'resolved': False,
+            'source': None,      # Cookie file the runtime copy was made from
+            'mtime': None,
+            'checked_at': 0.0,
+            'generation': 0      # Bumped on every (re)load
         }
+        
+        # Stream result LRU (video_id -> (expires_at, result)) and in-flight
+        # extractions so concurrent requests for one video share a single yt-dlp run
+        self._stream_cache = OrderedDict()
+        self._stream_cache_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        
+        # Idle YoutubeDL instances keyed by (kind, cookie_path); an instance is
+        # never shared between threads, so concurrent calls each check one out
+        self._ydl_pool = {}
+        self._ydl_pool_lock = threading.Lock()
+        self._extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_MAX_WORKERS,
+                                                    thread_name_prefix='ytdlp')
+        self._search_cache = _SearchCache()
+        
+        if NODE_PATH:
+            self.log(f'📦 Using Node.js JS runtime from: {NODE_PATH}')
+        else:
+            self.log('⚠️ Node.js not found - some videos may fail')
     
     def _default_log(self, msg):
         """Default logging function"""
@@ -45,10 +205,63 @@ class YoutubeExtractor:
         self.log_func(msg)
     
     def get_cookie_file_path(self):
-        """Get or create cookie file path (reuse existing if available)."""
-        if self.cookie_manager['loaded'] and self.cookie_manager['path'] and os.path.exists(self.cookie_manager['path']):
-            return self.cookie_manager['path']
+        """Get cookie file path, resolved once per extractor
         
+        The source file is re-stat'ed at most every COOKIE_RECHECK_INTERVAL
+        seconds and cookies are reloaded only if its mtime changed.
+        """
+        manager = self.cookie_manager
+        if manager['resolved']:
+            now = time.monotonic()
+            if now - manager['checked_at'] < COOKIE_RECHECK_INTERVAL:
+                return manager['path']
+            manager['checked_at'] = now
+            if self._cookie_source_mtime(manager['source']) == manager['mtime']:
+                return manager['path']
+            self.log('🍪 Cookie source changed, reloading')
+            with self._ydl_pool_lock:
+                self._ydl_pool.clear()
+        manager['source'] = None
+        cookie_path = self._resolve_cookie_file_path()
+        manager['path'] = cookie_path
+        manager['loaded'] = bool(cookie_path)
+        manager['mtime'] = self._cookie_source_mtime(manager['source'])
+        manager['checked_at'] = time.monotonic()
+        manager['generation'] += 1
+        manager['resolved'] = True
+        return cookie_path
+    
+    @staticmethod
+    def _cookie_source_mtime(source):
+        if not source:
+            return None
+        try:
+            return os.stat(source).st_mtime
+        except OSError:
+            return None
+    
+    def _write_runtime_cookies(self, cookie_data):
+        """Copy cookie data to the runtime file, skipping the write if it is already current"""
+        cookie_path = os.path.join(tempfile.gettempdir(), "yt_cookies_runtime.txt")
+        hash_path = cookie_path + ".hash"
+        data = cookie_data.encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        try:
+            with open(hash_path, "r") as f:
+                if f.read() == digest and os.path.exists(cookie_path):
+                    return cookie_path
+        except OSError:
+            pass
+        # Write-then-rename so concurrently booting workers never see a partial file
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(cookie_path), delete=False) as f:
+            f.write(data)
+        os.replace(f.name, cookie_path)
+        with open(hash_path, "w") as f:
+            f.write(digest)
+        return cookie_path
+    
+    def _resolve_cookie_file_path(self):
+        """Search the known cookie locations and YTDLP_COOKIES for usable cookies"""
         # Check multiple possible locations
         possible_paths = [
             self.cookies_file,           # Explicitly provided
@@ -64,16 +277,9 @@ class YoutubeExtractor:
                     with open(path, "r", encoding='utf-8') as f:
                         cookie_data = f.read()
                     if cookie_data.strip():
-                        temp_dir = tempfile.gettempdir()
-                        cookie_path = os.path.join(temp_dir, "yt_cookies_runtime.txt")
-                        
-                        if not os.path.exists(cookie_path):
-                            with open(cookie_path, "w", encoding='utf-8') as f:
-                                f.write(cookie_data)
-                        
-                        self.cookie_manager['path'] = cookie_path
-                        self.cookie_manager['loaded'] = True
+                        cookie_path = self._write_runtime_cookies(cookie_data)
                         self.log(f'🍪 Cookies loaded from: {path} ({len(cookie_data)} bytes)')
+                        self.cookie_manager['source'] = path
                         return cookie_path
                 except Exception as e:
                     self.log(f'⚠️ Failed to load cookies from {path}: {e}')
@@ -83,15 +289,7 @@ class YoutubeExtractor:
         cookie_data = os.environ.get("YTDLP_COOKIES")
         if cookie_data:
             try:
-                temp_dir = tempfile.gettempdir()
-                cookie_path = os.path.join(temp_dir, "yt_cookies_runtime.txt")
-                
-                if not os.path.exists(cookie_path):
-                    with open(cookie_path, "w", encoding='utf-8') as f:
-                        f.write(cookie_data)
-                
-                self.cookie_manager['path'] = cookie_path
-                self.cookie_manager['loaded'] = True
+                cookie_path = self._write_runtime_cookies(cookie_data)
                 self.log(f'🍪 Cookies loaded from environment (YTDLP_COOKIES)')
                 return cookie_path
             except Exception as e:
@@ -100,48 +298,92 @@ class YoutubeExtractor:
         self.log('⚠️ No cookies found - authentication may be required')
         return None
     
+    @contextmanager
+    def _ydl(self, kind, params):
+        """Check out a reusable YoutubeDL instance for one call"""
+        cookie_path = self.get_cookie_file_path()
+        # YoutubeDL loads the cookie jar once, so instances are tied to a cookie generation
+        generation = self.cookie_manager['generation']
+        key = (kind, cookie_path, generation)
+        with self._ydl_pool_lock:
+            idle = self._ydl_pool.setdefault(key, [])
+            ydl = idle.pop() if idle else None
+        if ydl is None:
+            opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'skip_download': True,
+                'cachedir': YTDLP_CACHE_DIR,
+                'socket_timeout': self.timeout
+            }
+            opts.update(params)
+            if cookie_path:
+                opts['cookiefile'] = cookie_path
+            ydl = yt_dlp.YoutubeDL(opts)
+        try:
+            yield ydl
+        finally:
+            with self._ydl_pool_lock:
+                # Instances holding a reloaded cookie jar are dropped
+                if generation == self.cookie_manager['generation']:
+                    self._ydl_pool.setdefault(key, []).append(ydl)
+    
     def search_youtube(self, query, limit=5):
-        """Search YouTube using yt-dlp subprocess (proven method)"""
+        """Search YouTube using yt-dlp (in-process API, subprocess fallback)"""
+        cached = self._search_cache.get((query, limit))
+        if cached is not None:
+            return list(cached)
         try:
-            # Use subprocess with sys.executable -m for reliable execution
-            command = [
-                sys.executable, "-m", "yt_dlp",
-                f"ytsearch{limit}:{query}",
-                "--dump-single-json",
-                "--flat-playlist",
-                "--no-cache-dir"
-            ]
-            
-            # Add cookies if available
-            cookie_path = self.get_cookie_file_path()
-            if cookie_path:
-                command.extend(["--cookies", cookie_path])
-            
-            process = subprocess.run(command, capture_output=True, text=True, check=False, timeout=self.timeout)
-            
-            if process.returncode != 0:
-                self.log(f'⚠️ Search failed: {process.stderr[:200]}')
-                return []
-            
-            data = json.loads(process.stdout)
+            if yt_dlp is not None:
+                with self._ydl('search', {'extract_flat': 'in_playlist'}) as ydl:
+                    data = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
+            else:
+                # Use subprocess with sys.executable -m for reliable execution
+                command = [
+                    sys.executable, "-m", "yt_dlp",
+                    f"ytsearch{limit}:{query}",
+                    "--dump-single-json",
+                    "--flat-playlist",
+                    "--cache-dir", YTDLP_CACHE_DIR
+                ]
+                
+                # Add cookies if available
+                cookie_path = self.get_cookie_file_path()
+                if cookie_path:
+                    command.extend(["--cookies", cookie_path])
+                
+                # stdout stays bytes: _json_loads parses it without a str decode
+                process = subprocess.run(command, capture_output=True, check=False, timeout=self.timeout)
+                
+                if process.returncode != 0:
+                    self.log(f"⚠️ Search failed: {process.stderr[:200].decode('utf-8', 'replace')}")
+                    return []
+                
+                data = _json_loads(process.stdout)
             
             results = []
-            if 'entries' in data:
-                for entry in data['entries'][:limit]:
-                    if entry:
-                        results.append({
-                            'videoId': entry.get('id', ''),
-                            'id': entry.get('id', ''),
-                            'title': entry.get('title', 'Unknown Title'),
-                            'name': entry.get('title', 'Unknown Title'),
-                            'duration': entry.get('duration_string', 'Unknown'),
-                            'url': f"https://www.youtube.com/watch?v={entry.get('id', '')}",
-                            'thumbnail': entry.get('thumbnail', f"https://img.youtube.com/vi/{entry.get('id', '')}/mqdefault.jpg"),
-                            'uploader': entry.get('uploader', 'Unknown'),
-                            'artist': entry.get('uploader', 'Unknown')
-                        })
+            # ytsearch{limit} already caps the entries; islice just guards a single pass
+            for entry in islice((data or {}).get('entries') or (), limit):
+                if entry:
+                    video_id = entry.get('id', '')
+                    title = entry.get('title', 'Unknown Title')
+                    uploader = entry.get('uploader', 'Unknown')
+                    results.append({
+                        'videoId': video_id,
+                        'id': video_id,
+                        'title': title,
+                        'name': title,
+                        'duration': entry.get('duration_string', 'Unknown'),
+                        'url': YT_WATCH_URL + video_id,
+                        'thumbnail': entry.get('thumbnail', YT_THUMB_URL + video_id + '/mqdefault.jpg'),
+                        'uploader': uploader,
+                        'artist': uploader
+                    })
             
             self.log(f'✅ Search found {len(results)} results for: {query}')
+            if results:
+                self._search_cache.put((query, limit), results)
+                return list(results)
             return results
         except subprocess.TimeoutExpired:
             self.log(f'❌ Search timeout ({self.timeout}s)')
@@ -150,54 +392,115 @@ class YoutubeExtractor:
             self.log(f'Search error: {e}')
             return []
     
+    def _get_cached_stream(self, video_id):
+        """Return a copy of the cached stream result, or None if missing/expired"""
+        with self._stream_cache_lock:
+            cached = self._stream_cache.get(video_id)
+            if not cached:
+                return None
+            expires_at, result = cached
+            if time.time() >= expires_at:
+                del self._stream_cache[video_id]
+                return None
+            self._stream_cache.move_to_end(video_id)
+        return dict(result)
+    
+    def _cache_stream(self, video_id, result):
+        """Cache a successful extraction, capped by the stream URL's own expiry"""
+        ttl = STREAM_CACHE_TTL
+        try:
+            expire = parse_qs(urlparse(result['url']).query).get('expire')
+            if expire:
+                ttl = min(ttl, int(expire[0]) - time.time() - STREAM_URL_EXPIRY_MARGIN)
+        except (ValueError, TypeError):
+            pass
+        if ttl <= 0:
+            return
+        with self._stream_cache_lock:
+            self._stream_cache[video_id] = (time.time() + ttl, dict(result))
+            self._stream_cache.move_to_end(video_id)
+            # Evict the least recently used entries to stay bounded
+            while len(self._stream_cache) > STREAM_CACHE_MAX_ENTRIES:
+                self._stream_cache.popitem(last=False)
+    
     def extract_youtube_stream(self, video_id):
-        """Extract YouTube stream URL using yt-dlp subprocess (proven method)"""
+        """Extract YouTube stream URL (cached, single-flight per video_id)"""
+        cached = self._get_cached_stream(video_id)
+        if cached:
+            return cached
+        
+        with self._inflight_lock:
+            event = self._inflight.get(video_id)
+            is_owner = event is None
+            if is_owner:
+                event = self._inflight[video_id] = threading.Event()
+        
+        if not is_owner:
+            # Another request is already extracting this video; wait for its result
+            event.wait(self.timeout)
+            return self._get_cached_stream(video_id)
+        
+        try:
+            result = self._extract_youtube_stream_uncached(video_id)
+            if result:
+                self._cache_stream(video_id, result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(video_id, None)
+            event.set()
+    
+    def _extract_info_inprocess(self, video_id, youtube_url):
+        """Run the stream extraction through a pooled YoutubeDL instance, waiting at most self.timeout"""
+        self.log(f'🎬 Extracting video: {video_id}')
+        future = self._extract_executor.submit(self._run_stream_ydl, youtube_url)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            self.log(f'❌ Extraction timeout ({self.timeout}s)')
+            return None
+        except yt_dlp.utils.DownloadError as e:
+            self.log(f'❌ yt-dlp failed: {str(e)[:300]}')
+            return None
+    
+    def _run_stream_ydl(self, youtube_url):
+        with self._ydl('stream', STREAM_YDL_PARAMS) as ydl:
+            return ydl.extract_info(youtube_url, download=False)
+    
+    def _extract_info_subprocess(self, video_id, youtube_url):
+        """Run the stream extraction as a `python -m yt_dlp` subprocess"""
+        cmd = STREAM_CMD_PREFIX + [youtube_url]
+        
+        # Add cookies if available
+        cookie_path = self.get_cookie_file_path()
+        if cookie_path:
+            cmd.extend(['--cookies', cookie_path])
+        
+        self.log(f'🎬 Extracting video: {video_id}')
+        # stdout stays bytes: _json_loads parses it without a str decode
+        result = subprocess.run(cmd, capture_output=True, timeout=self.timeout)
+        
+        if result.returncode != 0:
+            self.log(f"❌ yt-dlp failed: {result.stderr[:300].decode('utf-8', 'replace')}")
+            return None
+        
+        try:
+            return _json_loads(result.stdout)
+        except json.JSONDecodeError as e:
+            self.log(f'❌ JSON parse error: {e}')
+            self.log(f"📝 stdout: {result.stdout[:200].decode('utf-8', 'replace')}")
+            return None
+    
+    def _extract_youtube_stream_uncached(self, video_id):
+        """Extract YouTube stream URL using yt-dlp (in-process API, subprocess fallback)"""
         try:
             youtube_url = f"https://www.youtube.com/watch?v={video_id}"
             
-            # Build yt-dlp command using sys.executable -m (most reliable)
-            cmd = [
-                sys.executable, "-m", "yt_dlp",
-                youtube_url,
-                '--no-cache-dir',
-                '--no-check-certificate',
-                '--dump-single-json',
-                '--no-playlist',
-                '-f', 'best[ext=mp4][protocol^=http]/best[protocol^=http]'
-            ]
-            
-            # Add Node.js as JS runtime for signature solving if available
-            node_path = shutil.which('node')
-            if node_path:
-                cmd.extend(['--js-runtimes', 'node'])
-                self.log(f'📦 Using Node.js JS runtime from: {node_path}')
+            if yt_dlp is not None:
+                data = self._extract_info_inprocess(video_id, youtube_url)
             else:
-                # Fallback: try common paths
-                for path in ['/usr/bin/node', '/usr/local/bin/node', '/bin/node']:
-                    if os.path.exists(path):
-                        cmd.extend(['--js-runtimes', 'node'])
-                        self.log(f'📦 Using Node.js JS runtime from: {path}')
-                        break
-                else:
-                    self.log('⚠️ Node.js not found - some videos may fail')
-            
-            # Add cookies if available
-            cookie_path = self.get_cookie_file_path()
-            if cookie_path:
-                cmd.extend(['--cookies', cookie_path])
-            
-            self.log(f'🎬 Extracting video: {video_id}')
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
-            
-            if result.returncode != 0:
-                self.log(f'❌ yt-dlp failed: {result.stderr[:300]}')
-                return None
-            
-            try:
-                data = json.loads(result.stdout)
-            except json.JSONDecodeError as e:
-                self.log(f'❌ JSON parse error: {e}')
-                self.log(f'📝 stdout: {result.stdout[:200]}')
+                data = self._extract_info_subprocess(video_id, youtube_url)
+            if not data:
                 return None
             
             stream_url = data.get('url')
@@ -228,24 +531,29 @@ class YoutubeExtractor:
     def extract_media_info(self, youtube_url: str):
         """Extract media info from URL (playlist or single video)"""
         try:
+            if yt_dlp is not None:
+                with self._ydl('media', {}) as ydl:
+                    # Sanitize so the result stays JSON-serializable like --dump-single-json
+                    return ydl.sanitize_info(ydl.extract_info(youtube_url, download=False))
+            
             command = [
                 sys.executable, "-m", "yt_dlp",
                 youtube_url,
                 '--dump-single-json',
-                '--no-cache-dir'
+                '--cache-dir', YTDLP_CACHE_DIR
             ]
             
             cookie_path = self.get_cookie_file_path()
             if cookie_path:
                 command.extend(['--cookies', cookie_path])
             
-            result = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+            result = subprocess.run(command, capture_output=True, timeout=self.timeout)
             
             if result.returncode != 0:
-                self.log(f'❌ Failed to extract: {result.stderr[:200]}')
+                self.log(f"❌ Failed to extract: {result.stderr[:200].decode('utf-8', 'replace')}")
                 return None
             
-            return json.loads(result.stdout)
+            return _json_loads(result.stdout)
         except Exception as e:
             self.log(f'Extract media info error: {e}')
             return None